@@ -0,0 +1,222 @@
+import os
+import argparse
+
+import numpy as np
+
+COLORS = ("red", "blue")
+WIN_TYPES = ("correct_guess", "incorrect_guess", "assassin")
+# Guess outcome codes, relative to the guessing team.
+OWN, OPPONENT, NEUTRAL, ASSASSIN, INVALID = range(5)
+OWNER_OUTCOMES = {"own": OWN, "opponent": OPPONENT, "neutral": NEUTRAL, "assassin": ASSASSIN}
+
+
+class GameTable:
+    # Game logs flattened into typed NumPy arrays, one table per level:
+    #   games    red/blue model codes, start team, winner and win type
+    #   turns    game, team color, spymaster and guesser model codes, num_cards
+    #   guesses  turn, position in the turn, outcome code and whether the game
+    #            actually revealed it (guesses after the first wrong one are not)
+    # Models are coded by their index in `models`. Every query is a vectorized
+    # group-by over these arrays.
+    def __init__(self, models, arrays):
+        self.models = list(models)
+        self.index = {model: i for i, model in enumerate(self.models)}
+        for name, array in arrays.items():
+            setattr(self, name, array)
+
+    ARRAYS = {
+        "game_red": np.int32,
+        "game_blue": np.int32,
+        "game_started": np.int8,
+        "game_winner": np.int8,
+        "game_win_type": np.int8,
+        "turn_game": np.int32,
+        "turn_team": np.int8,
+        "turn_spymaster": np.int32,
+        "turn_guesser": np.int32,
+        "turn_num_cards": np.int16,
+        "guess_turn": np.int32,
+        "guess_position": np.int16,
+        "guess_outcome": np.int8,
+        "guess_resolved": np.bool_,
+    }
+
+    @classmethod
+    def from_games(cls, games):
+        models = {}
+        columns = {name: [] for name in cls.ARRAYS}
+
+        def code(model):
+            return models.setdefault(model, len(models))
+
+        num_games = num_turns = 0
+        for game in games:
+            if game.get("winner") not in COLORS:
+                continue
+            columns["game_red"].append(code(game["red"]))
+            columns["game_blue"].append(code(game["blue"]))
+            columns["game_started"].append(COLORS.index(game["started"]))
+            columns["game_winner"].append(COLORS.index(game["winner"]))
+            columns["game_win_type"].append(WIN_TYPES.index(game["win_type"]))
+
+            owners = {
+                word: color for color, words in game["word_assignments"].items() for word in words
+            }
+            revealed = set()
+            for turn in game["turn_history"]:
+                team = turn["team"]
+                try:
+                    num_cards = int(turn["spymaster"][1])
+                except (TypeError, ValueError):
+                    num_cards = 0
+                columns["turn_game"].append(num_games)
+                columns["turn_team"].append(COLORS.index(team))
+                columns["turn_spymaster"].append(code(game[team]))
+                columns["turn_guesser"].append(code(game[team]))
+                columns["turn_num_cards"].append(num_cards)
+
+                resolved = True
+                for position, guess in enumerate(turn["guesser"]):
+                    owner = owners.get(guess)
+                    if owner is None or guess in revealed:
+                        outcome = INVALID
+                    elif owner in COLORS:
+                        outcome = OWN if owner == team else OPPONENT
+                    else:
+                        outcome = OWNER_OUTCOMES[owner]
+                    columns["guess_turn"].append(num_turns)
+                    columns["guess_position"].append(position)
+                    columns["guess_outcome"].append(outcome)
+                    columns["guess_resolved"].append(resolved)
+                    if resolved and outcome != INVALID:
+                        revealed.add(guess)
+                    resolved = resolved and outcome == OWN
+                num_turns += 1
+            num_games += 1
+
+        arrays = {name: np.asarray(columns[name], dtype=dtype) for name, dtype in cls.ARRAYS.items()}
+
+        return cls(sorted(models, key=models.get), arrays)
+
+    def save(self, path):
+        np.savez(path, models=np.asarray(self.models), **{name: getattr(self, name) for name in self.ARRAYS})
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["models"].tolist(), {name: data[name] for name in cls.ARRAYS})
+
+    def win_matrix(self):
+        # wins[i, j]: games model i won against model j; games[i, j]: games
+        # between them (symmetric). Self-play games are left out.
+        n = len(self.models)
+        winner = np.where(self.game_winner == 0, self.game_red, self.game_blue)
+        loser = np.where(self.game_winner == 0, self.game_blue, self.game_red)
+        played = winner != loser
+        wins = np.bincount(winner[played] * n + loser[played], minlength=n * n).reshape(n, n)
+
+        return wins, wins + wins.T
+
+    def role_attribution(self):
+        # Splits a team's results into the two roles. Per turn: the spymaster is
+        # credited with the clue size and the correct guesses it led to, the
+        # guesser with its precision. cross[s, g] is the mean number of correct
+        # guesses per turn with spymaster s and guesser g.
+        n = len(self.models)
+        resolved = self.guess_resolved
+        turn = self.guess_turn[resolved]
+        correct = np.bincount(turn, weights=self.guess_outcome[resolved] == OWN, minlength=len(self.turn_game))
+        assassin = np.bincount(turn, weights=self.guess_outcome[resolved] == ASSASSIN, minlength=len(self.turn_game))
+
+        guesser = self.turn_guesser[self.guess_turn]
+        first = resolved & (self.guess_position == 0)
+        spymaster_turns = np.bincount(self.turn_spymaster, minlength=n)
+        guesses = np.bincount(guesser[resolved], minlength=n)
+        first_guesses = np.bincount(guesser[first], minlength=n)
+        pair = self.turn_spymaster * n + self.turn_guesser
+        pair_turns = np.bincount(pair, minlength=n * n).reshape(n, n)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return {
+                "spymaster": {
+                    "turns": spymaster_turns,
+                    "mean_num_cards": np.bincount(self.turn_spymaster, self.turn_num_cards, n) / spymaster_turns,
+                    "correct_per_turn": np.bincount(self.turn_spymaster, correct, n) / spymaster_turns,
+                    "assassin_rate": np.bincount(self.turn_spymaster, assassin, n) / spymaster_turns,
+                },
+                "guesser": {
+                    "guesses": guesses,
+                    "accuracy": np.bincount(guesser[resolved], self.guess_outcome[resolved] == OWN, n) / guesses,
+                    "first_guess_accuracy": np.bincount(guesser[first], self.guess_outcome[first] == OWN, n)
+                    / first_guesses,
+                },
+                "cross": np.bincount(pair, correct, n * n).reshape(n, n) / pair_turns,
+                "cross_turns": pair_turns,
+            }
+
+    def accuracy_by_num_cards(self, max_cards=9):
+        # accuracy[i, k]: share of model i's resolved guesses that were correct
+        # on clues for k cards (k > max_cards is counted as max_cards).
+        n = len(self.models)
+        resolved = self.guess_resolved
+        turn = self.guess_turn[resolved]
+        guesser = self.turn_guesser[turn]
+        num_cards = np.clip(self.turn_num_cards[turn], 0, max_cards)
+        cell = guesser * (max_cards + 1) + num_cards
+        counts = np.bincount(cell, minlength=n * (max_cards + 1)).reshape(n, max_cards + 1)
+        correct = np.bincount(
+            cell, self.guess_outcome[resolved] == OWN, n * (max_cards + 1)
+        ).reshape(n, max_cards + 1)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return correct / counts, counts
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Head-to-head, role and clue size analytics over game logs.")
+    parser.add_argument(
+        "--log_dir", type=str, default="logs/", help="Directory with game logs."
+    )
+    parser.add_argument(
+        "--table_path",
+        type=str,
+        default=None,
+        help="Load the flattened logs from this .npz file if it exists, otherwise save them there.",
+    )
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    from plot import iter_games
+
+    args = parse_args()
+    if args.table_path and os.path.exists(args.table_path):
+        table = GameTable.load(args.table_path)
+    else:
+        table = GameTable.from_games(iter_games(args.log_dir))
+        if args.table_path:
+            table.save(args.table_path)
+
+    wins, games = table.win_matrix()
+    width = max([len(model) for model in table.models] + [5])
+    print("Head-to-head wins (row beat column):")
+    print(" " * width + "".join(f"{i:>8}" for i in range(len(table.models))))
+    for i, model in enumerate(table.models):
+        print(f"{model:<{width}}" + "".join(f"{w:>4}/{g:<3}" for w, g in zip(wins[i], games[i])))
+
+    roles = table.role_attribution()
+    print("\nRoles:")
+    print(f"{'model':<{width}} {'cards':>6} {'correct':>8} {'assassin':>9} {'accuracy':>9} {'first':>6}")
+    for i, model in enumerate(table.models):
+        spymaster, guesser = roles["spymaster"], roles["guesser"]
+        print(
+            f"{model:<{width}} {spymaster['mean_num_cards'][i]:6.2f} {spymaster['correct_per_turn'][i]:8.2f}"
+            f" {spymaster['assassin_rate'][i]:9.3f} {guesser['accuracy'][i]:9.3f} {guesser['first_guess_accuracy'][i]:6.3f}"
+        )
+
+    accuracy, counts = table.accuracy_by_num_cards()
+    print("\nGuess accuracy by num_cards:")
+    print(f"{'model':<{width}}" + "".join(f"{k:>7}" for k in range(1, accuracy.shape[1])))
+    for i, model in enumerate(table.models):
+        print(f"{model:<{width}}" + "".join(f"{a:7.2f}" if c else f"{'-':>7}" for a, c in zip(accuracy[i, 1:], counts[i, 1:])))
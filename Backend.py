@@ -0,0 +1,421 @@
+import os
+import json
+import time
+import random
+import threading
+
+from JsonStream import JsonStream
+from LogStore import LogStore, list_json_logs
+
+
+class BackendError(Exception):
+    # Transport-level failure of a backend call. Retryable errors (network
+    # problems, timeouts, 5xx responses, rate limits) are retried with backoff.
+    def __init__(self, message, status_code=None, retry_after=None, retryable=True):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.retryable = retryable
+
+
+class RateLimitError(BackendError):
+    pass
+
+
+def to_backend_error(error):
+    response = getattr(error, "response", None)
+    status_code = getattr(response, "status_code", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        retry_after = float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        retry_after = None
+
+    if status_code == 429:
+        return RateLimitError(str(error), status_code, retry_after)
+    # Other client errors (bad request, auth, ...) will not succeed on a retry.
+    retryable = status_code is None or status_code >= 500 or status_code == 408
+    return BackendError(str(error), status_code, retry_after, retryable)
+
+
+class LLMBackend:
+    # A backend answers a single prompt for a model. The keyword context holds the
+    # structured game state behind the prompt (role, team_color, word_assignments,
+    # clue_word, num_cards, left_over_words); remote backends ignore it. Results
+    # follow the fal any-llm shape: a dict with at least an "output" string.
+    # Backends that can cache a static system prompt on the provider side set
+    # supports_prompt_caching and receive cache_system_prompt=True.
+    supports_prompt_caching = False
+    # Backends that answer a list of requests in a single round trip set
+    # supports_batching and override complete_batch.
+    supports_batching = False
+    # Backends that stream their answer as it is generated set supports_streaming
+    # and override stream.
+    supports_streaming = False
+
+    def complete(self, model, system_prompt, prompt, **context):
+        raise NotImplementedError
+
+    def complete_batch(self, requests):
+        # requests are (model, system_prompt, prompt, context) tuples. Returns one
+        # result per request, or the BackendError that request failed with.
+        results = []
+        for model, system_prompt, prompt, context in requests:
+            try:
+                results.append(self.complete(model, system_prompt, prompt, **context))
+            except BackendError as e:
+                results.append(e)
+
+        return results
+
+    def stream(self, model, system_prompt, prompt, **context):
+        # Yields the "output" text in chunks. Closing the generator early stops
+        # the answer from being read any further.
+        yield self.complete(model, system_prompt, prompt, **context)["output"]
+
+
+class FalBackend(LLMBackend):
+    def __init__(self, application="fal-ai/any-llm"):
+        self.application = application
+
+    def complete(self, model, system_prompt, prompt, **context):
+        import fal_client
+
+        try:
+            return fal_client.subscribe(
+                self.application,
+                arguments={
+                    "model": model,
+                    "system_prompt": system_prompt,
+                    "prompt": prompt,
+                },
+            )
+        except Exception as e:
+            raise to_backend_error(e) from e
+
+    supports_streaming = True
+
+    def stream(self, model, system_prompt, prompt, **context):
+        import fal_client
+
+        try:
+            # Every event carries the output generated so far.
+            seen = ""
+            for event in fal_client.stream(
+                self.application,
+                arguments={
+                    "model": model,
+                    "system_prompt": system_prompt,
+                    "prompt": prompt,
+                },
+            ):
+                output = event.get("output") or ""
+                if len(output) > len(seen) and output.startswith(seen):
+                    yield output[len(seen) :]
+                    seen = output
+        except Exception as e:
+            raise to_backend_error(e) from e
+
+
+class MockBackend(LLMBackend):
+    # Deterministic offline backend. The spymaster gives numbered clues and
+    # remembers which of its team's words they target; the guesser picks those
+    # words with probability `accuracy` and otherwise guesses at random.
+    def __init__(self, latency=0.0, failure_rate=0.0, malformed_rate=0.0, accuracy=0.7, seed=0):
+        assert 0 <= failure_rate <= 1, "failure_rate must be between 0 and 1"
+        assert 0 <= malformed_rate <= 1, "malformed_rate must be between 0 and 1"
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.malformed_rate = malformed_rate
+        self.accuracy = accuracy
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.num_clues = 0
+        self.clue_targets = {}
+
+    supports_batching = True
+    supports_streaming = True
+
+    def complete(self, model, system_prompt, prompt, **context):
+        if self.latency:
+            time.sleep(self.latency)
+
+        return self.answer(model, context)
+
+    def stream(self, model, system_prompt, prompt, **context):
+        # The answer arrives in small chunks spread over `latency`, followed by
+        # some chatter like real models add.
+        output = self.answer(model, context)["output"] + "\nLet me know if you need anything else!"
+        chunks = [output[i : i + 8] for i in range(0, len(output), 8)]
+        for chunk in chunks:
+            if self.latency:
+                time.sleep(self.latency / len(chunks))
+            yield chunk
+
+    def complete_batch(self, requests):
+        # One simulated round trip for the whole batch.
+        if self.latency:
+            time.sleep(self.latency)
+        results = []
+        for model, _, _, context in requests:
+            try:
+                results.append(self.answer(model, context))
+            except BackendError as e:
+                results.append(e)
+
+        return results
+
+    def answer(self, model, context):
+        with self.lock:
+            if self.rng.random() < self.failure_rate:
+                raise BackendError(f"Mock failure for model {model}")
+            if self.rng.random() < self.malformed_rate:
+                return {"output": "I am not sure what to answer here."}
+            if context["role"] == "spymaster":
+                output = self.spymaster_answer(context["team_color"], context["word_assignments"])
+            else:
+                output = self.guesser_answer(
+                    context["clue_word"], context["num_cards"], context["left_over_words"]
+                )
+
+        return {"output": json.dumps(output)}
+
+    def spymaster_answer(self, team_color, word_assignments):
+        own_words = word_assignments[team_color]
+        num_cards = self.rng.randint(1, min(3, len(own_words)))
+        self.num_clues += 1
+        hint = f"clue{self.num_clues}"
+        self.clue_targets[hint] = self.rng.sample(own_words, num_cards)
+
+        return {"hint": hint, "num_cards": num_cards}
+
+    def guesser_answer(self, clue_word, num_cards, left_over_words):
+        targets = [w for w in self.clue_targets.pop(clue_word, []) if w in left_over_words]
+        guesses = []
+        for _ in range(int(num_cards)):
+            candidates = [w for w in left_over_words if w not in guesses]
+            if not candidates:
+                break
+            if targets and self.rng.random() < self.accuracy:
+                guesses.append(targets.pop(0))
+            else:
+                guess = self.rng.choice(candidates)
+                if guess in targets:
+                    targets.remove(guess)
+                guesses.append(guess)
+
+        return {"guesses": guesses}
+
+
+class CachedBackend(LLMBackend):
+    # Serves repeated prompts from a ResponseCache. Retries after a malformed
+    # answer (attempt > 0) skip the lookup and overwrite the cached result, so a
+    # bad answer is not served again on the next run.
+    def __init__(self, backend, cache):
+        self.backend = backend
+        self.cache = cache
+        self.supports_prompt_caching = backend.supports_prompt_caching
+        self.supports_streaming = backend.supports_streaming
+
+    def complete(self, model, system_prompt, prompt, **context):
+        if context.get("attempt", 0) == 0:
+            result = self.cache.get(model, system_prompt, prompt)
+            if result is not None:
+                return {**result, "cached": True}
+
+        result = self.backend.complete(model, system_prompt, prompt, **context)
+        self.cache.put(model, system_prompt, prompt, result)
+
+        return result
+
+    def stream(self, model, system_prompt, prompt, **context):
+        # Only complete answers are cached. Readers stop at the end of the JSON
+        # object, so the answer is cached as soon as its closing brace arrives
+        # rather than when the stream ends.
+        if context.get("attempt", 0) == 0:
+            result = self.cache.get(model, system_prompt, prompt)
+            if result is not None:
+                yield result["output"]
+                return
+
+        parser = JsonStream()
+        for chunk in self.backend.stream(model, system_prompt, prompt, **context):
+            parser.feed(chunk)
+            if parser.done:
+                self.cache.put(model, system_prompt, prompt, {"output": parser.text})
+                yield chunk
+                return
+            yield chunk
+        self.cache.put(model, system_prompt, prompt, {"output": parser.text})
+
+
+class BatchingBackend(LLMBackend):
+    # Coalesces requests made concurrently by different games into a single
+    # complete_batch call. The first request to arrive waits up to max_wait
+    # seconds (or until max_batch_size requests are queued) and then sends the
+    # whole batch; the other callers block until their result is in.
+    def __init__(self, backend, max_batch_size=32, max_wait=0.005):
+        assert backend.supports_batching, "backend does not support batching"
+        self.backend = backend
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.supports_prompt_caching = backend.supports_prompt_caching
+        self.lock = threading.Lock()
+        self.batch_full = threading.Condition(self.lock)
+        self.pending = []
+        self.num_batches = 0
+        self.num_requests = 0
+
+    def complete(self, model, system_prompt, prompt, **context):
+        request = {
+            "request": (model, system_prompt, prompt, context),
+            "done": threading.Event(),
+            "result": None,
+        }
+        with self.lock:
+            self.pending.append(request)
+            is_leader = len(self.pending) == 1
+            if len(self.pending) >= self.max_batch_size:
+                self.batch_full.notify()
+
+        if is_leader:
+            with self.lock:
+                self.batch_full.wait_for(
+                    lambda: len(self.pending) >= self.max_batch_size, timeout=self.max_wait
+                )
+                batch, self.pending = self.pending, []
+                self.num_batches += 1
+                self.num_requests += len(batch)
+            self.send(batch)
+
+        request["done"].wait()
+        if isinstance(request["result"], Exception):
+            raise request["result"]
+
+        return request["result"]
+
+    def send(self, batch):
+        try:
+            results = self.backend.complete_batch([r["request"] for r in batch])
+        except Exception as e:
+            results = [e] * len(batch)
+        for request, result in zip(batch, results):
+            request["result"] = result
+            request["done"].set()
+
+    def stats(self):
+        return {
+            "requests": self.num_requests,
+            "round_trips": self.num_batches,
+            "avg_batch_size": self.num_requests / self.num_batches if self.num_batches else 0.0,
+        }
+
+
+def read_log_games(log_dir="logs/"):
+    if LogStore.exists(log_dir):
+        return list(LogStore(log_dir).iter_games())
+
+    games = []
+    for file_name in list_json_logs(log_dir):
+        with open(os.path.join(log_dir, file_name), "r") as f:
+            games.append(json.load(f))
+
+    return games
+
+
+class ReplayBackend(LLMBackend):
+    # Re-serves responses recorded in earlier game logs (a log store or
+    # game_N.json files). Answers are looked up by
+    # (model, team, role, remaining board words), which identifies a turn of a
+    # replayed game exactly, also in the two games of a duplicate pair. Turns that diverge from the recording fall back to recorded
+    # answers of the same model and role.
+    def __init__(self, log_dir="logs/", latency=0.0):
+        self.latency = latency
+        self.games = read_log_games(log_dir)
+        self.lock = threading.Lock()
+        self.responses = {}
+        self.fallback = {}
+        self.fallback_index = {}
+        for game in self.games:
+            self.index_game(game)
+
+    def index_game(self, game):
+        remaining = {
+            color: list(words) for color, words in game["word_assignments"].items()
+        }
+        for turn in game["turn_history"]:
+            team_color = turn["team"]
+            model = game[team_color]
+            board = frozenset(w for words in remaining.values() for w in words)
+            hint, num_cards = turn["spymaster"]
+            spymaster_output = {"hint": hint, "num_cards": num_cards}
+            guesser_output = {"guesses": turn["guesser"]}
+            self.responses[(model, team_color, "spymaster", board)] = spymaster_output
+            self.responses[(model, team_color, "guesser", board)] = guesser_output
+            self.fallback.setdefault((model, "spymaster"), []).append(spymaster_output)
+            self.fallback.setdefault((model, "guesser"), []).append(guesser_output)
+
+            for guess in turn["guesser"]:
+                owner = next((c for c, words in remaining.items() if guess in words), None)
+                if owner is None:
+                    break
+                remaining[owner].remove(guess)
+                if owner != team_color:
+                    break
+
+    supports_batching = True
+
+    def complete(self, model, system_prompt, prompt, **context):
+        if self.latency:
+            time.sleep(self.latency)
+
+        return self.answer(model, context)
+
+    def complete_batch(self, requests):
+        if self.latency:
+            time.sleep(self.latency)
+        results = []
+        for model, _, _, context in requests:
+            try:
+                results.append(self.answer(model, context))
+            except BackendError as e:
+                results.append(e)
+
+        return results
+
+    def answer(self, model, context):
+        role = context["role"]
+        if role == "spymaster":
+            assignments = context["word_assignments"]
+            board = frozenset(w for words in assignments.values() for w in words)
+        else:
+            board = frozenset(context["left_over_words"])
+
+        output = self.responses.get((model, context["team_color"], role, board))
+        if output is None:
+            output = self.next_fallback(model, role)
+            if role == "guesser":
+                allowed = [g for g in output["guesses"] if g in board]
+                output = {"guesses": allowed or sorted(board)[:1]}
+
+        return {"output": json.dumps(output)}
+
+    def next_fallback(self, model, role):
+        outputs = self.fallback.get((model, role))
+        if not outputs:
+            raise BackendError(f"No recorded {role} responses for model {model}")
+        with self.lock:
+            index = self.fallback_index.get((model, role), 0)
+            self.fallback_index[(model, role)] = index + 1
+
+        return outputs[index % len(outputs)]
+
+
+def get_backend(name, **kwargs):
+    if name == "fal":
+        return FalBackend()
+    if name == "mock":
+        return MockBackend(**kwargs)
+    if name == "replay":
+        return ReplayBackend(**kwargs)
+    raise ValueError(f"Unknown backend: {name}")
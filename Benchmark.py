@@ -0,0 +1,234 @@
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import platform
+import tempfile
+import subprocess
+
+import plot
+from Game import CodeNamesGame
+from LogStore import LogStore
+from Player import parse_json_output
+from main import get_log_path, write_json_log
+
+
+class NoOpSpymaster:
+    def do_turn_spymaster(self, word_assignments):
+        return "clue", 2
+
+
+class NoOpGuesser:
+    # Guesses random left-over words, so games take a realistic number of turns
+    # and end in all three ways.
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+
+    def do_turn_guesser(self, clue_word, num_cards, left_over_words):
+        return self.rng.sample(left_over_words, min(num_cards, len(left_over_words)))
+
+
+def play_noop_game(seed):
+    game = CodeNamesGame(
+        red_spymaster=NoOpSpymaster(),
+        red_guesser=NoOpGuesser(seed),
+        blue_spymaster=NoOpSpymaster(),
+        blue_guesser=NoOpGuesser(seed + 1),
+        seed=seed,
+    )
+    game.run()
+
+    return game
+
+
+def noop_log(seed):
+    game = play_noop_game(seed)
+    return {
+        "blue": "noop-blue",
+        "red": "noop-red",
+        "seed": game.seed,
+        "started": game.start_team,
+        "winner": game.winner,
+        "win_type": game.win_type,
+        "words": game.game_words,
+        "word_assignments": game.original_word_assignments,
+        "turn_history": game.turn_history,
+    }
+
+
+def timed(fn, repeat=3):
+    # Best of `repeat` runs, the least noisy estimate on a shared machine.
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+
+    return best
+
+
+def bench_engine(num_games):
+    turns = sum(len(play_noop_game(seed).turn_history) for seed in range(num_games))
+    seconds = timed(lambda: [play_noop_game(seed) for seed in range(num_games)])
+
+    return {
+        "games": num_games,
+        "turns": turns,
+        "seconds": seconds,
+        "games_per_second": num_games / seconds,
+        "turns_per_second": turns / seconds,
+    }
+
+
+PARSE_SAMPLES = {
+    "plain": '{"hint": "ocean", "num_cards": 3}',
+    "fenced": '```json\n{"guesses": ["wave", "ship", "anchor"]}\n```',
+    "surrounded": 'Sure! Here is my answer:\n{"hint": "ocean", "num_cards": 3}\nGood luck!',
+}
+
+
+def bench_parsing(num_calls):
+    results = {}
+    for name, text in PARSE_SAMPLES.items():
+        seconds = timed(lambda: [parse_json_output(text) for _ in range(num_calls)])
+        results[name] = {"calls": num_calls, "seconds": seconds, "calls_per_second": num_calls / seconds}
+
+    return results
+
+
+def bench_log_writes(existing_counts, num_writes):
+    # Cost of one more log write with `existing` games already logged, for
+    # game_N.json files (get_log_path lists the directory on every write) and
+    # for the log store.
+    log_data = noop_log(0)
+    results = []
+    for existing in existing_counts:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            json_dir = os.path.join(tmp_dir, "json")
+            os.makedirs(json_dir)
+            for i in range(1, existing + 1):
+                open(os.path.join(json_dir, f"game_{i}.json"), "w").close()
+            store = LogStore(os.path.join(tmp_dir, "store"))
+            for _ in range(existing):
+                store.append(log_data)
+
+            path_seconds = timed(lambda: [get_log_path(json_dir) for _ in range(num_writes)])
+            json_seconds = timed(lambda: [write_json_log(log_data, json_dir) for _ in range(num_writes)], 1)
+            store_seconds = timed(lambda: [store.append(log_data) for _ in range(num_writes)], 1)
+        results.append(
+            {
+                "existing_logs": existing,
+                "get_log_path_ms": 1000 * path_seconds / num_writes,
+                "json_write_ms": 1000 * json_seconds / num_writes,
+                "store_append_ms": 1000 * store_seconds / num_writes,
+            }
+        )
+
+    return results
+
+
+PLOT_FUNCTIONS = [
+    plot.plot_num_games_played,
+    plot.plot_win_rates,
+    plot.plot_game_ending_types,
+    plot.plot_average_spymaster_num_cards,
+    plot.plot_average_turns_per_game,
+    plot.plot_guessing_accuracy_per_team,
+    plot.plot_first_move_advantage,
+    plot.plot_latency_percentiles,
+    plot.plot_cost_per_win,
+    plot.plot_ratings,
+]
+
+
+def bench_aggregation(game_counts):
+    # plot.aggregate over json logs and a log store, and rendering every chart.
+    results = []
+    for num_games in game_counts:
+        logs = [noop_log(seed) for seed in range(num_games)]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            json_dir = os.path.join(tmp_dir, "json")
+            store_dir = os.path.join(tmp_dir, "store")
+            store = LogStore(store_dir)
+            for log_data in logs:
+                write_json_log(log_data, json_dir)
+                store.append(log_data)
+
+            json_seconds = timed(lambda: plot.aggregate(json_dir))
+            store_seconds = timed(lambda: plot.aggregate(store_dir))
+            stats = plot.aggregate(store_dir)
+            plot_seconds = {}
+            for plot_function in PLOT_FUNCTIONS:
+                save_path = os.path.join(tmp_dir, "plot.png")
+                plot_seconds[plot_function.__name__] = timed(lambda: plot_function(stats, save_path), 1)
+        results.append(
+            {
+                "games": num_games,
+                "aggregate_json_seconds": json_seconds,
+                "aggregate_store_seconds": store_seconds,
+                "plot_seconds": plot_seconds,
+            }
+        )
+
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the engine, parsing, log writing and aggregation.")
+    parser.add_argument(
+        "--output",
+        type=str,
+        default="benchmarks.jsonl",
+        help="Results are appended here as one JSON line per run.",
+    )
+    parser.add_argument(
+        "--quick",
+        action="store_true",
+        help="Smaller sizes, for a fast smoke run.",
+    )
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    # Games log every guess at INFO, which would dominate the engine timings.
+    logging.disable(logging.WARNING)
+
+    if args.quick:
+        sizes = {"engine": 50, "parse": 2_000, "writes": 20, "existing": [0, 100], "games": [50]}
+    else:
+        sizes = {"engine": 1_000, "parse": 50_000, "writes": 100, "existing": [0, 1_000, 10_000], "games": [100, 1_000, 5_000]}
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "quick": args.quick,
+        "engine": bench_engine(sizes["engine"]),
+        "parsing": bench_parsing(sizes["parse"]),
+        "log_writes": bench_log_writes(sizes["existing"], sizes["writes"]),
+        "aggregation": bench_aggregation(sizes["games"]),
+    }
+
+    with open(args.output, "a") as f:
+        f.write(json.dumps(results) + "\n")
+    json.dump(results, sys.stdout, indent=2)
+    print()
@@ -0,0 +1,58 @@
+OWNERS = ("red", "blue", "neutral", "assassin")
+OWNER_CODES = {owner: code for code, owner in enumerate(OWNERS)}
+
+
+class Board:
+    # Fixed-size board: every word gets a slot index, the owner of each slot is
+    # stored as a small int and revealed slots as bits of an int, so lookups,
+    # reveals and remaining counts are constant time.
+    def __init__(self, word_assignments, words=None):
+        self.words = []
+        self.index = {}
+        self.owner = bytearray()
+        for owner in OWNERS:
+            for word in word_assignments.get(owner, []):
+                self.index[word] = len(self.words)
+                self.words.append(word)
+                self.owner.append(OWNER_CODES[owner])
+        # Order in which left over words are listed, defaults to slot order.
+        self.order = [self.index[w] for w in words] if words is not None else list(range(len(self.words)))
+        self.revealed = 0
+        self.remaining = [len(word_assignments.get(owner, [])) for owner in OWNERS]
+
+    def __len__(self):
+        return len(self.words)
+
+    def __contains__(self, word):
+        slot = self.index.get(word)
+        return slot is not None and not self.revealed >> slot & 1
+
+    def owner_of(self, word):
+        slot = self.index.get(word)
+        return OWNERS[self.owner[slot]] if slot is not None else None
+
+    def reveal(self, word):
+        # Returns the owner of the revealed word, or None if the word is not on
+        # the board or was already revealed.
+        slot = self.index.get(word)
+        if slot is None or self.revealed >> slot & 1:
+            return None
+        self.revealed |= 1 << slot
+        code = self.owner[slot]
+        self.remaining[code] -= 1
+
+        return OWNERS[code]
+
+    def remaining_count(self, owner):
+        return self.remaining[OWNER_CODES[owner]]
+
+    def left_over_words(self):
+        return [self.words[i] for i in self.order if not self.revealed >> i & 1]
+
+    def assignments(self, include_revealed=False):
+        assignments = {owner: [] for owner in OWNERS}
+        for slot, word in enumerate(self.words):
+            if include_revealed or not self.revealed >> slot & 1:
+                assignments[OWNERS[self.owner[slot]]].append(word)
+
+        return assignments
@@ -0,0 +1,90 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+
+class ResponseCache:
+    # On-disk cache of backend results keyed on (model, system_prompt, prompt).
+    # When more than max_entries results are stored, the least recently used
+    # ones are evicted.
+    def __init__(self, path="cache/responses.sqlite", max_entries=100_000):
+        assert max_entries > 0, "max_entries must be positive"
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, model TEXT, result TEXT, last_access REAL)"
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)"
+        )
+        self.conn.commit()
+
+    @staticmethod
+    def make_key(model, system_prompt, prompt):
+        payload = json.dumps([model, system_prompt, prompt])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, model, system_prompt, prompt):
+        key = self.make_key(model, system_prompt, prompt)
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT result FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.conn.execute(
+                "UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key)
+            )
+            self.conn.commit()
+
+        return json.loads(row[0])
+
+    def put(self, model, system_prompt, prompt, result):
+        key = self.make_key(model, system_prompt, prompt)
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, result, last_access) "
+                "VALUES (?, ?, ?, ?)",
+                (key, model, json.dumps(result), time.time()),
+            )
+            self.evict()
+            self.conn.commit()
+
+    def evict(self):
+        (num_entries,) = self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+        if num_entries <= self.max_entries:
+            return
+        self.conn.execute(
+            "DELETE FROM responses WHERE key IN ("
+            "SELECT key FROM responses ORDER BY last_access ASC LIMIT ?)",
+            (num_entries - self.max_entries,),
+        )
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total > 0 else 0.0,
+            "entries": len(self),
+        }
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
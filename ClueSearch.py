@@ -0,0 +1,138 @@
+import threading
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+ClueCandidate = namedtuple(
+    "ClueCandidate", ["clue", "num_cards", "targets", "score", "margin", "assassin_margin"]
+)
+
+
+class ClueSearch:
+    # Scores the whole clue vocabulary against a board in one pass. The
+    # (vocabulary x board) similarity matrix is computed once per board and
+    # cached; later turns only mask the words that have been revealed. A board
+    # is only reused during its own game (and its mirror) and takes 25 x
+    # vocabulary floats, about 5 MB for 50k words, so the cache holds a board
+    # per game in flight.
+    def __init__(self, word_vectors, max_cards=3, min_margin=0.0, assassin_penalty=1.0, cache_size=4):
+        self.word_vectors = word_vectors
+        self.max_cards = max_cards
+        self.min_margin = min_margin
+        self.assassin_penalty = assassin_penalty
+        self.cache_size = cache_size
+        self.board_cache = OrderedDict()
+        self.lock = threading.Lock()
+
+        vectors = word_vectors.vectors
+        norms = np.linalg.norm(vectors[: min(len(vectors), 1000)], axis=1)
+        if not np.allclose(norms, 1.0, atol=1e-3):
+            vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-8)
+        self.vectors = np.asarray(vectors, dtype=np.float32)
+
+    def board_similarities(self, board_words):
+        # Returns (columns, similarities) for a cached board that contains all
+        # board_words; the revealed words of that board are simply not used.
+        # Similarities are stored as (board words x vocabulary) so per-turn
+        # reductions run over contiguous rows.
+        words = frozenset(board_words)
+        with self.lock:
+            for key in reversed(self.board_cache):
+                if words <= key:
+                    self.board_cache.move_to_end(key)
+                    return self.board_cache[key]
+
+        known = sorted(w for w in words if w in self.word_vectors)
+        board_vectors = self.vectors[[self.word_vectors.index[w] for w in known]]
+        sims = np.ascontiguousarray(board_vectors @ self.vectors.T)
+        # Board words can never be clues.
+        for word in words:
+            if word in self.word_vectors:
+                sims[:, self.word_vectors.index[word]] = np.nan
+        entry = ({w: i for i, w in enumerate(known)}, sims)
+
+        with self.lock:
+            self.board_cache[words] = entry
+            while len(self.board_cache) > self.cache_size:
+                self.board_cache.popitem(last=False)
+
+        return entry
+
+    def search(self, word_assignments, team_color, top_k=5):
+        board_words = [w for words in word_assignments.values() for w in words]
+        columns, sims = self.board_similarities(board_words)
+        own_words = [w for w in word_assignments[team_color] if w in columns]
+        bad_words = [
+            w
+            for color, words in word_assignments.items()
+            if color not in (team_color, "assassin")
+            for w in words
+            if w in columns
+        ]
+        assassin_words = [w for w in word_assignments.get("assassin", []) if w in columns]
+        if not own_words:
+            return []
+
+        vocab_size = sims.shape[1]
+        own_sims = sims[[columns[w] for w in own_words]]
+        bad_max = sims[[columns[w] for w in bad_words]].max(axis=0) if bad_words else np.full(vocab_size, -1.0)
+        assassin_max = (
+            sims[[columns[w] for w in assassin_words]].max(axis=0)
+            if assassin_words
+            else np.full(vocab_size, -1.0)
+        )
+        danger = np.maximum(bad_max, assassin_max)
+
+        # Cheap pre-pass over the whole vocabulary: count the own words that beat
+        # every other word. Only clues covering (nearly) the most words can end up
+        # on top, so the full scoring below runs on those few rows. If no clue
+        # covers anything, fall back to the least bad clues.
+        max_cards = min(self.max_cards, len(own_words))
+        coverage = np.minimum((own_sims > danger + self.min_margin).sum(axis=0), max_cards)
+        best_coverage = int(coverage.max())
+        rows = np.flatnonzero(coverage >= max(best_coverage - 1, 1))
+        if len(rows) == 0:
+            best_margin = np.nan_to_num(own_sims.max(axis=0) - danger, nan=-np.inf)
+            num_rows = min(vocab_size, top_k * 4)
+            rows = np.argpartition(-best_margin, num_rows - 1)[:num_rows]
+            rows = rows[np.isfinite(best_margin[rows])]
+
+        # Each candidate's most similar own words, best first.
+        order = np.argsort(-own_sims[:, rows], axis=0)[:max_cards]
+        top_sims = np.take_along_axis(own_sims[:, rows], order, axis=0)
+
+        # A clue covers the own words that are clearly more similar to it than
+        # any opponent, neutral or assassin word.
+        margins = top_sims - danger[rows]
+        num_cards = np.maximum((margins > self.min_margin).sum(axis=0), 1)
+        margin = margins[num_cards - 1, np.arange(len(rows))]
+        assassin_margin = top_sims[num_cards - 1, np.arange(len(rows))] - assassin_max[rows]
+        score = (
+            num_cards
+            + np.clip(margin, 0, 1)
+            - self.assassin_penalty * (assassin_margin < self.min_margin + 0.1)
+        )
+
+        # Only the best few clues are checked for the substring rule in Python.
+        lowered_board = [w.lower() for w in board_words]
+        candidates = []
+        for i in np.argsort(-score):
+            clue = self.word_vectors.words[rows[i]]
+            lowered = clue.lower()
+            if any(lowered in w or w in lowered for w in lowered_board):
+                continue
+            n = int(num_cards[i])
+            candidates.append(
+                ClueCandidate(
+                    clue=clue,
+                    num_cards=n,
+                    targets=[own_words[j] for j in order[:n, i]],
+                    score=float(score[i]),
+                    margin=float(margin[i]),
+                    assassin_margin=float(assassin_margin[i]),
+                )
+            )
+            if len(candidates) == top_k:
+                break
+
+        return candidates
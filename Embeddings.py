@@ -0,0 +1,98 @@
+import os
+import argparse
+
+import numpy as np
+
+
+class WordVectors:
+    # Unit-normalised word vectors. Saved as <path>.npy (float32 matrix) and
+    # <path>.vocab (one word per line) so the matrix can be memory-mapped and
+    # shared between games and processes without copying.
+    def __init__(self, words, vectors):
+        assert len(words) == len(vectors), "words and vectors must have the same length"
+        self.words = list(words)
+        self.vectors = vectors
+        self.index = {word: i for i, word in enumerate(self.words)}
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        vectors = np.load(f"{path}.npy", mmap_mode="r" if mmap else None)
+        with open(f"{path}.vocab", "r", encoding="utf-8") as f:
+            words = f.read().splitlines()
+
+        return cls(words, vectors)
+
+    @classmethod
+    def from_text(cls, text_path, limit=None, extra_words=()):
+        # Reads GloVe/word2vec style text files ("word v1 v2 ..."). The first
+        # `limit` words are kept, plus any of `extra_words` found later on.
+        extra_words = set(extra_words)
+        words, vectors = [], []
+        with open(text_path, "r", encoding="utf-8") as f:
+            for line in f:
+                parts = line.rstrip().split(" ")
+                if len(parts) < 3:  # word2vec header line
+                    continue
+                word = parts[0]
+                if limit is not None and len(words) >= limit and word not in extra_words:
+                    continue
+                words.append(word)
+                vectors.append(np.asarray(parts[1:], dtype=np.float32))
+
+        vectors = np.vstack(vectors)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-8)
+
+        return cls(words, vectors)
+
+    def save(self, path):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.save(f"{path}.npy", np.ascontiguousarray(self.vectors, dtype=np.float32))
+        with open(f"{path}.vocab", "w", encoding="utf-8") as f:
+            f.write("\n".join(self.words))
+
+    def __contains__(self, word):
+        return word in self.index
+
+    def __len__(self):
+        return len(self.words)
+
+    def lookup(self, words):
+        # Returns the rows for the words that have a vector, and which words those are.
+        known = [w for w in words if w in self.index]
+        return self.vectors[[self.index[w] for w in known]], known
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Convert a text word-vector file to the memory-mappable format."
+    )
+    parser.add_argument("text_path", type=str, help="GloVe/word2vec text file.")
+    parser.add_argument("output_path", type=str, help="Output path prefix.")
+    parser.add_argument(
+        "--limit",
+        type=int,
+        default=50_000,
+        help="Number of (most frequent) words to keep as clue vocabulary.",
+    )
+    parser.add_argument(
+        "--wordlist_path",
+        type=str,
+        default="assets/words.txt",
+        help="Board words which are always kept.",
+    )
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    with open(args.wordlist_path, "r", encoding="utf-8") as f:
+        board_words = f.read().splitlines()
+
+    word_vectors = WordVectors.from_text(args.text_path, args.limit, board_words)
+    word_vectors.save(args.output_path)
+    missing = [w for w in board_words if w not in word_vectors]
+    print(f"Saved {len(word_vectors)} vectors to {args.output_path}.npy")
+    if missing:
+        print(f"[WARNING] {len(missing)} board words have no vector: {missing}")
@@ -1,103 +1,174 @@
-import copy
 import random
+import logging
+import functools
 
-from pprint import pprint
+from Board import Board
+from Logger import current_game
 
-def get_random_words(wordlist_path="assets/words.txt", num_words=25):
+logger = logging.getLogger(__name__)
+
+# The word list is read once per process and shared, read-only, by all games.
+@functools.lru_cache(maxsize=None)
+def load_wordlist(wordlist_path="assets/words.txt"):
     with open(wordlist_path, "r", encoding="utf-8") as file:
-        words = file.read().splitlines()
+        return tuple(file.read().splitlines())
+
+def get_random_words(wordlist_path="assets/words.txt", num_words=25, rng=random):
+    words = load_wordlist(wordlist_path)
 
-    return random.sample(words, min(num_words, len(words)))
+    return rng.sample(words, min(num_words, len(words)))
 
 
 class CodeNamesGame:
-    def __init__(self, red_spymaster, red_guesser, blue_spymaster, blue_guesser):
-        self.setup_game()
+    def __init__(self, red_spymaster, red_guesser, blue_spymaster, blue_guesser, word_assignments=None, start_team=None, seed=None, on_turn=None, mirrored=False):
+        # All board randomness comes from a per-game generator, so a seed
+        # reproduces the board, team split and start team exactly.
+        self.seed = seed if seed is not None else random.randrange(2**32)
+        self.rng = random.Random(self.seed)
+        # The mirrored game of a duplicate pair plays the same board with the
+        # models' colors swapped (see Scheduler.duplicate_schedule); it gets its
+        # own game id for logging.
+        self.mirrored = mirrored
+        self.game_id = f"{self.seed}-mirrored" if mirrored else self.seed
+        self.setup_game(word_assignments, start_team)
         self.blue_team = {"spymaster": blue_spymaster, "guesser": blue_guesser}
         self.red_team = {"spymaster": red_spymaster, "guesser": red_guesser}
         self.winner = None
         self.win_type = None
+        # Called with the game after every turn, e.g. to checkpoint it.
+        self.on_turn = on_turn
 
-    def setup_game(self):
-        self.game_words = get_random_words(
-            wordlist_path="assets/words.txt", num_words=25
-        )
-        self.left_over_words = self.game_words.copy()
-        self.start_team = random.choice(["red", "blue"])
-        if self.start_team == "red":
-            red_words, blue_words = 9, 8
+    def setup_game(self, word_assignments=None, start_team=None):
+        # A fixed board (e.g. from a game log) can be passed in to replay a game.
+        # For random boards start_team optionally overrides the drawn start team.
+        if word_assignments is not None:
+            assert start_team in {"red", "blue"}, "start_team is required with a fixed board"
+            self.start_team = start_team
+            self.game_words = [w for words in word_assignments.values() for w in words]
         else:
-            red_words, blue_words = 8, 9
-        shuffled_words = random.sample(self.game_words, len(self.game_words))
-        self.word_assignments = {
-            "red": shuffled_words[:red_words],
-            "blue": shuffled_words[red_words : red_words + blue_words],
-            "neutral": shuffled_words[red_words + blue_words : 24],
-            "assassin": [shuffled_words[24]],
-        }
-        self.original_word_assignments = copy.deepcopy(self.word_assignments)
+            self.game_words = get_random_words(
+                wordlist_path="assets/words.txt", num_words=25, rng=self.rng
+            )
+            self.start_team = self.rng.choice(["red", "blue"])
+            if start_team is not None:
+                self.start_team = start_team
+            if self.start_team == "red":
+                red_words, blue_words = 9, 8
+            else:
+                red_words, blue_words = 8, 9
+            shuffled_words = self.rng.sample(self.game_words, len(self.game_words))
+            word_assignments = {
+                "red": shuffled_words[:red_words],
+                "blue": shuffled_words[red_words : red_words + blue_words],
+                "neutral": shuffled_words[red_words + blue_words : 24],
+                "assassin": [shuffled_words[24]],
+            }
+        self.board = Board(word_assignments, words=self.game_words)
+        self.original_word_assignments = self.board.assignments(include_revealed=True)
         self.turn_history = []
 
+    @property
+    def word_assignments(self):
+        return self.board.assignments()
+
+    @property
+    def left_over_words(self):
+        return self.board.left_over_words()
+
     def do_turn(self, team_color):
-        pprint(self.word_assignments)
-        if team_color == "blue":
-            team = self.blue_team
-            opponent_color = "red"
-        elif team_color == "red":
-            team = self.red_team
-            opponent_color = "blue"
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Board: %s", self.word_assignments)
+        team = self.blue_team if team_color == "blue" else self.red_team
 
         hint, num_cards = team["spymaster"].do_turn_spymaster(self.word_assignments)
-        print(f"{team_color} Spymaster: {num_cards} hint: {hint}")
-        guesses = team["guesser"].do_turn_guesser(hint, num_cards, self.left_over_words)
-        self.turn_history.append({"team": team_color, "spymaster": (hint, num_cards), "guesser": guesses})
+        logger.info("%s Spymaster: %s hint: %s", team_color, num_cards, hint)
+        if getattr(team["guesser"], "stream", False):
+            # Streamed guesses are revealed as they arrive and the stream is
+            # stopped at the first wrong one; only revealed guesses are returned.
+            guesses = team["guesser"].do_turn_guesser(
+                hint, num_cards, self.left_over_words, on_guess=lambda guess: self.resolve_guess(team_color, guess)
+            )
+            self.check_winner(team_color)
+        else:
+            guesses = team["guesser"].do_turn_guesser(hint, num_cards, self.left_over_words)
+            self.resolve_turn(team_color, guesses)
+        self.turn_history.append(
+            {
+                "team": team_color,
+                "spymaster": (hint, num_cards),
+                "guesser": guesses,
+                "stats": {
+                    "spymaster": getattr(team["spymaster"], "last_turn_stats", None),
+                    "guesser": getattr(team["guesser"], "last_turn_stats", None),
+                },
+            }
+        )
 
+    def resolve_turn(self, team_color, guesses):
         for guess in guesses:
-            print(f"{team_color} guesser: {guess} ...", end=" ")
-            if guess not in self.left_over_words:
-                print(
-                    f"\n[WARNING] Guesser guessed a word which was not part of the allowed words! Guess: {guess}, allowed words: {str(self.left_over_words)}"
-                )
-                break
-            self.left_over_words.remove(guess)
-            if guess in self.word_assignments[team_color]:  # Correct guess
-                print("correct!")
-                self.word_assignments[team_color].remove(guess)
-            elif guess in self.word_assignments[opponent_color]:  # Incorrect guess, opponent's color
-                print(f"incorrect! {guess} belonged to {opponent_color}!")
-                self.word_assignments[opponent_color].remove(guess)
-                break
-            elif guess in self.word_assignments["neutral"]:  # Incorrect guess, neutral
-                print(f"incorrect! {guess} was neutral!")
-                self.word_assignments["neutral"].remove(guess)
-                break
-            elif guess in self.word_assignments["assassin"]:  # Incorrect guess, assassin
-                print(f"incorrect! {guess} was the assassin!")
-                self.word_assignments["assassin"].remove(guess)
+            if not self.resolve_guess(team_color, guess):
                 break
-            else:
-                print(f"[WARNING] Guesser guessed a word which was not part of the allowed words! Guess: {guess}, allowed words: {str(self.left_over_words)}")
+        self.check_winner(team_color)
+
+    def resolve_guess(self, team_color, guess):
+        # Reveals a guess, returns whether the team may keep guessing.
+        opponent_color = "red" if team_color == "blue" else "blue"
+        owner = self.board.reveal(guess)
+        if owner is None:
+            logger.warning(
+                "Guesser guessed a word which was not part of the allowed words! Guess: %s, allowed words: %s",
+                guess,
+                self.left_over_words,
+            )
+            return False
+        if owner == team_color:  # Correct guess
+            logger.info("%s guesser: %s ... correct!", team_color, guess)
+            return True
+        if owner == opponent_color:  # Incorrect guess, opponent's color
+            logger.info("%s guesser: %s ... incorrect! %s belonged to %s!", team_color, guess, guess, opponent_color)
+        elif owner == "neutral":  # Incorrect guess, neutral
+            logger.info("%s guesser: %s ... incorrect! %s was neutral!", team_color, guess, guess)
+        else:  # Incorrect guess, assassin
+            logger.info("%s guesser: %s ... incorrect! %s was the assassin!", team_color, guess, guess)
+        return False
 
+    def check_winner(self, team_color):
+        opponent_color = "red" if team_color == "blue" else "blue"
         # Current team lost
-        if len(self.word_assignments[opponent_color]) == 0:
+        if self.board.remaining_count(opponent_color) == 0:
             self.winner = opponent_color
             self.win_type = "incorrect_guess"
             return
 
-        if len(self.word_assignments["assassin"]) == 0:
+        if self.board.remaining_count("assassin") == 0:
             self.winner = opponent_color
             self.win_type = "assassin"
             return
 
         # Current team won
-        if len(self.word_assignments[team_color]) == 0:
+        if self.board.remaining_count(team_color) == 0:
             self.winner = team_color
             self.win_type = "correct_guess"
             return
 
+    def restore(self, turn_history):
+        # Re-applies the turns of a checkpointed game without calling players.
+        # The game must have been created with the same seed or board.
+        for turn in turn_history:
+            self.turn_history.append(turn)
+            self.resolve_turn(turn["team"], turn["guesser"])
+
     def run(self):
-        current_turn = self.start_team
-        while self.winner is None:
-            self.do_turn(current_turn)
-            current_turn = "blue" if current_turn == "red" else "red"
-        print(f"Game over! Winner is team {self.winner}")
+        token = current_game.set(self.game_id)
+        try:
+            current_turn = self.start_team
+            if self.turn_history:
+                current_turn = "blue" if self.turn_history[-1]["team"] == "red" else "red"
+            while self.winner is None:
+                self.do_turn(current_turn)
+                if self.on_turn is not None:
+                    self.on_turn(self)
+                current_turn = "blue" if current_turn == "red" else "red"
+            logger.info("Game over! Winner is team %s", self.winner)
+        finally:
+            current_game.reset(token)
@@ -0,0 +1,74 @@
+import json
+
+
+class JsonStream:
+    # Incremental parser for a JSON object streamed in chunks. Text before the
+    # first "{" (like ```json) is skipped and the object is complete as soon as
+    # its closing brace arrives, so trailing chatter never has to be read. With
+    # an item_key, the strings in that key's array are returned by feed as soon
+    # as each one is complete, e.g. guesses before the whole answer is in.
+    def __init__(self, item_key=None):
+        self.item_key = item_key
+        self.text = ""
+        self.pos = 0
+        self.start = None
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.string_start = None
+        self.last_string = None
+        self.key = None
+        self.items_depth = None
+        self.items = []
+        self.value = None
+        self.done = False
+
+    def feed(self, chunk):
+        # Returns the items completed by this chunk.
+        self.text += chunk
+        new_items = []
+        while self.pos < len(self.text) and not self.done:
+            c = self.text[self.pos]
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif c == "\\":
+                    self.escaped = True
+                elif c == '"':
+                    self.in_string = False
+                    try:
+                        string = json.loads(self.text[self.string_start : self.pos + 1])
+                    except json.JSONDecodeError:
+                        string = None
+                    if self.depth == self.items_depth and string is not None:
+                        new_items.append(string)
+                    else:
+                        self.last_string = string
+            elif self.start is None:
+                if c == "{":
+                    self.start = self.pos
+                    self.depth = 1
+            elif c == '"':
+                self.in_string = True
+                self.string_start = self.pos
+            elif c == ":" and self.depth == 1:
+                self.key = self.last_string
+            elif c in "{[":
+                self.depth += 1
+                if c == "[" and self.depth == 2 and self.item_key is not None and self.key == self.item_key:
+                    self.items_depth = 2
+            elif c in "}]":
+                if self.depth == self.items_depth:
+                    self.items_depth = None
+                self.depth -= 1
+                if self.depth == 0:
+                    self.done = True
+                    try:
+                        self.value = json.loads(self.text[self.start : self.pos + 1])
+                    except json.JSONDecodeError:
+                        pass
+            self.pos += 1
+
+        self.items += new_items
+
+        return new_items
@@ -0,0 +1,44 @@
+import numpy as np
+
+LOCAL_PLAYERS = ["local/embedding"]
+
+
+class EmbeddingPlayer:
+    # Non-LLM player that can be used in place of Player. Clues and guesses are
+    # picked from cosine similarities between word vectors. The ClueSearch can
+    # be shared between players so its per-board cache is reused.
+    def __init__(self, team_color: str, role: str, clue_search):
+        assert team_color in {
+            "blue",
+            "red",
+        }, "team_color must be either 'blue' or 'red'"
+        assert role in {
+            "spymaster",
+            "guesser",
+        }, "role must be either 'spymaster' or 'guesser'"
+        self.model = LOCAL_PLAYERS[0]
+        self.team_color = team_color
+        self.role = role
+        self.clue_search = clue_search
+        self.word_vectors = clue_search.word_vectors
+        self.last_turn_stats = None
+
+    def do_turn_spymaster(self, word_assignments):
+        candidates = self.clue_search.search(word_assignments, self.team_color, top_k=1)
+        if not candidates:
+            return self.word_vectors.words[0], 1
+
+        return candidates[0].clue, candidates[0].num_cards
+
+    def do_turn_guesser(self, clue_word, num_cards, left_over_words):
+        num_cards = max(int(num_cards), 1)
+        if clue_word not in self.word_vectors:
+            return list(left_over_words[:1])
+
+        vectors, known = self.word_vectors.lookup(left_over_words)
+        if not known:
+            return list(left_over_words[:1])
+        sims = vectors @ self.word_vectors.vectors[self.word_vectors.index[clue_word]]
+        order = np.argsort(-sims)[:num_cards]
+
+        return [known[i] for i in order]
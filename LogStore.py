@@ -0,0 +1,207 @@
+import os
+import json
+import argparse
+import threading
+
+GAMES_PREFIX = "games-"
+TURNS_PREFIX = "turns-"
+
+
+class LogStore:
+    # Append-only game log store. Every game gets a monotonically increasing
+    # game_id; game-level fields go to games-NNNNN.jsonl and turns to
+    # turns-NNNNN.jsonl as child rows keyed by game_id, so readers that only need
+    # game-level columns never parse turn histories. Segments hold
+    # `segment_size` games. The turns of a game are written before its game row,
+    # which acts as the commit marker: a game counts once its row is complete.
+    # A store expects a single writing process.
+    def __init__(self, log_dir="logs/", segment_size=10_000, durable=False):
+        os.makedirs(log_dir, exist_ok=True)
+        self.log_dir = log_dir
+        self.segment_size = segment_size
+        self.durable = durable
+        self.lock = threading.Lock()
+        self.next_id = self.last_game_id() + 1
+        # Segment files this writer has checked for a torn last line.
+        self.checked_paths = set()
+
+    @staticmethod
+    def exists(log_dir="logs/"):
+        return os.path.isdir(log_dir) and any(
+            f.startswith(GAMES_PREFIX) for f in os.listdir(log_dir)
+        )
+
+    def segment_path(self, prefix, segment):
+        return os.path.join(self.log_dir, f"{prefix}{segment:05d}.jsonl")
+
+    def segments(self):
+        return sorted(
+            int(f[len(GAMES_PREFIX) : -len(".jsonl")])
+            for f in os.listdir(self.log_dir)
+            if f.startswith(GAMES_PREFIX) and f.endswith(".jsonl")
+        )
+
+    def last_game_id(self):
+        segments = self.segments()
+        if not segments:
+            return 0
+        # Only the tail of the newest segment has to be read.
+        with open(self.segment_path(GAMES_PREFIX, segments[-1]), "rb") as f:
+            f.seek(0, os.SEEK_END)
+            start = max(0, f.tell() - 65536)
+            f.seek(start)
+            # Drop a partial first line (when not at the start of the file) and
+            # a partial last line.
+            lines = f.read().split(b"\n")[1 if start > 0 else 0 : -1]
+        if not lines:
+            return segments[-1] * self.segment_size
+
+        return json.loads(lines[-1])["game_id"]
+
+    def append(self, log_data):
+        with self.lock:
+            game_id = self.next_id
+            self.next_id += 1
+            segment = (game_id - 1) // self.segment_size
+
+            turn_history = log_data.get("turn_history", [])
+            game_row = {"game_id": game_id, "num_turns": len(turn_history)}
+            game_row.update((k, v) for k, v in log_data.items() if k != "turn_history")
+            turn_rows = [
+                {"game_id": game_id, "turn": i, **turn} for i, turn in enumerate(turn_history)
+            ]
+
+            if turn_rows:
+                self.write_lines(self.segment_path(TURNS_PREFIX, segment), turn_rows)
+            self.write_lines(self.segment_path(GAMES_PREFIX, segment), [game_row])
+
+        return game_id
+
+    def write_lines(self, path, rows):
+        # A single write() on an O_APPEND descriptor, so concurrent readers never
+        # see rows of one game interleaved with another.
+        data = "".join(json.dumps(row) + "\n" for row in rows).encode("utf-8")
+        fd = os.open(path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            if path not in self.checked_paths:
+                # A crash in the middle of a write leaves a partial last line;
+                # end it so the next row starts on a line of its own. Readers
+                # skip the broken line.
+                size = os.fstat(fd).st_size
+                if size > 0 and os.pread(fd, 1, size - 1) != b"\n":
+                    data = b"\n" + data
+                self.checked_paths.add(path)
+            os.write(fd, data)
+            if self.durable:
+                os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def iter_games(self, columns=None, with_turns=True, offsets=None):
+        # Yields games in game_id order. `columns` projects the game-level
+        # fields. When `offsets` is given (a dict of file name -> byte offset) only
+        # rows after those offsets are read and the dict is advanced, which lets
+        # callers process new games incrementally.
+        for segment in self.segments():
+            games_path = self.segment_path(GAMES_PREFIX, segment)
+            turns_path = self.segment_path(TURNS_PREFIX, segment)
+            games_name, turns_name = os.path.basename(games_path), os.path.basename(turns_path)
+            start = offsets.get(games_name, 0) if offsets is not None else 0
+            rows = list(read_rows(games_path, start, offsets, games_name))
+            if not rows:
+                continue
+
+            turns = {}
+            if with_turns and os.path.exists(turns_path):
+                # Turns written after the last committed game belong to a game
+                # that is still being written and are left for the next read.
+                # Turns of a game that crashed before its game row was written
+                # stay behind with an id that the next game reuses; they come
+                # before that game's own turns and are dropped below.
+                last_id = rows[-1]["game_id"]
+                turns_start = offsets.get(turns_name, 0) if offsets is not None else 0
+                for turn in read_rows(turns_path, turns_start, offsets, turns_name, max_game_id=last_id):
+                    game_id = turn.pop("game_id")
+                    turn.pop("turn")
+                    turns.setdefault(game_id, []).append(turn)
+
+            for row in rows:
+                game_id = row["game_id"]
+                game_turns = turns.get(game_id, [])
+                num_turns = row.get("num_turns", len(game_turns))
+                if columns is not None:
+                    row = {k: row[k] for k in columns if k in row}
+                if with_turns:
+                    row["turn_history"] = game_turns[len(game_turns) - num_turns :]
+                yield row
+
+    def __len__(self):
+        return self.next_id - 1
+
+
+def read_rows(path, start=0, offsets=None, name=None, max_game_id=None):
+    # Reads complete JSON lines from `start`. A trailing partial line (a write
+    # in progress) is ignored and not consumed; a broken line left by a crashed
+    # write is skipped.
+    with open(path, "rb") as f:
+        f.seek(start)
+        offset = start
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                offset += len(line)
+                if offsets is not None:
+                    offsets[name] = offset
+                continue
+            if max_game_id is not None and row["game_id"] > max_game_id:
+                break
+            offset += len(line)
+            if offsets is not None:
+                offsets[name] = offset
+            yield row
+
+
+def list_json_logs(log_dir="logs/"):
+    # Legacy logs/game_N.json files in game number order.
+    if not os.path.isdir(log_dir):
+        return []
+    file_names = [
+        f for f in os.listdir(log_dir) if f.startswith("game_") and f[5:-5].isdigit()
+    ]
+
+    return sorted(file_names, key=lambda f: int(f[5:-5]))
+
+
+def convert_json_logs(src_dir, store):
+    # Appends legacy logs/game_N.json files to a store in game number order,
+    # after any games the store already holds.
+    file_names = list_json_logs(src_dir)
+    for file_name in file_names:
+        with open(os.path.join(src_dir, file_name), "r") as f:
+            store.append(json.load(f))
+
+    return len(file_names)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Convert logs/game_N.json files into a log store."
+    )
+    parser.add_argument(
+        "--src_dir", type=str, default="logs/", help="Directory with game_N.json logs."
+    )
+    parser.add_argument(
+        "--dst_dir", type=str, default="logs/", help="Directory of the log store."
+    )
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    store = LogStore(args.dst_dir)
+    num_games = convert_json_logs(args.src_dir, store)
+    print(f"Converted {num_games} games into {args.dst_dir}")
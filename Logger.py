@@ -0,0 +1,90 @@
+import sys
+import json
+import time
+import logging
+import contextvars
+
+# Id of the game being played in the current thread, attached to every log
+# record and metrics record so output of concurrent games can be told apart.
+current_game = contextvars.ContextVar("current_game", default=None)
+
+
+class GameContextFilter(logging.Filter):
+    def filter(self, record):
+        record.game = current_game.get()
+        return True
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        message = super().format(record)
+        if record.game is not None:
+            message = f"[game {record.game}] {message}"
+        if record.levelno >= logging.WARNING:
+            message = f"[{record.levelname}] {message}"
+
+        return message
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "game": record.game,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+
+        return json.dumps(entry)
+
+
+def setup_logging(level=logging.WARNING, json_output=False):
+    handler = logging.StreamHandler(sys.stderr)
+    handler.addFilter(GameContextFilter())
+    handler.setFormatter(JsonFormatter() if json_output else TextFormatter())
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(level)
+
+
+class Progress:
+    # Compact live progress line for long runs. It rewrites a single line on a
+    # terminal and falls back to an occasional plain line otherwise.
+    def __init__(self, total, in_flight=None, stream=sys.stderr, interval=10.0):
+        self.total = total
+        self.in_flight = in_flight
+        self.stream = stream
+        self.interval = interval if not stream.isatty() else 0.2
+        self.started_at = time.monotonic()
+        self.last_shown = 0.0
+        self.num_done = 0
+        self.num_failed = 0
+
+    def update(self, failed=False):
+        if failed:
+            self.num_failed += 1
+        else:
+            self.num_done += 1
+        now = time.monotonic()
+        if now - self.last_shown >= self.interval or self.num_done + self.num_failed == self.total:
+            self.last_shown = now
+            self.show()
+
+    def show(self):
+        minutes = max(time.monotonic() - self.started_at, 1e-9) / 60
+        line = (
+            f"games {self.num_done}/{self.total} done, {self.num_failed} failed, "
+            f"{self.num_done / minutes:.1f} games/min"
+        )
+        if self.in_flight is not None:
+            line += f", {self.in_flight()} calls in flight"
+        if self.stream.isatty():
+            self.stream.write(f"\r{line}\033[K")
+            if self.num_done + self.num_failed == self.total:
+                self.stream.write("\n")
+        else:
+            self.stream.write(line + "\n")
+        self.stream.flush()
@@ -0,0 +1,48 @@
+import json
+import time
+import threading
+
+
+def estimate_tokens(text):
+    # Rough estimate (~4 characters per token) for providers that do not report usage.
+    return (len(text) + 3) // 4 if text else 0
+
+
+def load_prices(path):
+    # JSON file mapping model -> {"input": usd_per_1m_tokens, "output": usd_per_1m_tokens}.
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+class MetricsSink:
+    # Collects one record per backend call. Records are appended as JSON lines to
+    # `path` (when given) and cost is derived from `prices` when the provider
+    # does not report it.
+    def __init__(self, path=None, prices=None):
+        self.prices = prices or {}
+        self.lock = threading.Lock()
+        self.file = open(path, "a") if path is not None else None
+
+    def cost(self, model, result, prompt_tokens, completion_tokens):
+        if result.get("cached"):
+            return 0.0
+        if result.get("cost") is not None:
+            return float(result["cost"])
+        price = self.prices.get(model)
+        if price is None:
+            return None
+        return (prompt_tokens * price["input"] + completion_tokens * price["output"]) / 1e6
+
+    def emit(self, record):
+        if self.file is None:
+            return
+        record = {"time": time.time(), **record}
+        with self.lock:
+            self.file.write(json.dumps(record) + "\n")
+            self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            with self.lock:
+                self.file.close()
+                self.file = None
@@ -1,6 +1,17 @@
 import re
 import json
-import fal_client
+import time
+import logging
+import threading
+import contextlib
+
+from Backend import BackendError, FalBackend, RateLimitError
+from JsonStream import JsonStream
+from Logger import current_game
+from Metrics import MetricsSink, estimate_tokens
+from Retry import CircuitOpenError, RetryPolicy, get_circuit_breaker
+
+logger = logging.getLogger(__name__)
 
 ALLOWED_PLAYERS = [
     "anthropic/claude-3.5-sonnet",
@@ -17,9 +28,81 @@ ALLOWED_PLAYERS = [
     "openai/gpt-4o",
 ]
 
+SYS_PROMPT = """
+        You are playing Codenames. The game consists of two teams: Red Team and Blue Team. Each team has a Spymaster and a Guesser.
+        Spymaster: Knows which words belong to their team, the opposing team, neutral words, and the assassin. Gives a one-word clue and a number indicating how many words are related to the clue. Example: "Ocean 2" means two words relate to "Ocean." Only respond with a single word and a number, separated by a space.
+        Guesser: Tries to guess their team's words based on the clue. If they guess correctly, their team scores. If they guess an opposing team's word, the other team gains a point. If they guess a neutral word or an opponent's word, the turn ends. If they guess the assassin word, their team loses immediately. Respond with the number of words specified by the hint. Respond with the words, seperated by a space. Put the words you are most confident in first. Example: 'water boat'.
+        Teams take turns. The goal is to guess all of your team's words before the opposing team while avoiding the assassin. The game ends when a team finds all their words or someone picks the assassin.
+        """
+
+# Shorter rules for prompt_mode="compact".
+COMPACT_SYS_PROMPT = """Codenames: teams red and blue each have a spymaster and a guesser. The spymaster sees who owns every word (red, blue, neutral, assassin) and gives a one-word clue plus a number. The guesser picks words, most certain first; a non-team word ends the turn and the assassin loses the game. The first team to find all its words wins."""
+
+# Per-model cap on concurrent requests, shared by all players in the process so
+# that a concurrent tournament does not flood a single provider.
+_max_in_flight_per_model = None
+_model_semaphores = {}
+_model_semaphores_lock = threading.Lock()
+
+
+def set_max_in_flight_per_model(limit):
+    global _max_in_flight_per_model
+    assert limit is None or limit > 0, "limit must be a positive integer or None"
+    with _model_semaphores_lock:
+        _max_in_flight_per_model = limit
+        _model_semaphores.clear()
+
+
+_num_in_flight = 0
+_num_in_flight_lock = threading.Lock()
+
+
+def in_flight_calls():
+    return _num_in_flight
+
+
+@contextlib.contextmanager
+def count_in_flight():
+    global _num_in_flight
+    with _num_in_flight_lock:
+        _num_in_flight += 1
+    try:
+        yield
+    finally:
+        with _num_in_flight_lock:
+            _num_in_flight -= 1
+
+
+def model_slot(model):
+    if _max_in_flight_per_model is None:
+        return contextlib.nullcontext()
+    with _model_semaphores_lock:
+        if model not in _model_semaphores:
+            _model_semaphores[model] = threading.BoundedSemaphore(
+                _max_in_flight_per_model
+            )
+        return _model_semaphores[model]
+
+
+def parse_json_output(text):
+    # gemini and gpt return a response like ```json{...}```, while llama and claude do not. This filters the response.
+    cleaned_output = re.sub(
+        r"^```json|```$",
+        "",
+        text.strip("```json").strip("```").strip(),
+    ).strip()
+    try:
+        return json.loads(cleaned_output)
+    except json.JSONDecodeError:
+        # Cheap local repair: some models add chatter around the JSON object.
+        match = re.search(r"\{.*\}", text, re.DOTALL)
+        if match is None:
+            raise
+        return json.loads(match.group(0))
+
 
 class Player:
-    def __init__(self, team_color: str, role: str, model: str):
+    def __init__(self, team_color: str, role: str, model: str, backend=None, retry_policy=None, max_format_retries=5, metrics=None, prompt_mode="full", stream=False):
         assert team_color in {
             "blue",
             "red",
@@ -31,24 +114,201 @@ class Player:
         self.model = model
         self.team_color = team_color
         self.role = role
+        self.backend = backend if backend is not None else FalBackend()
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self.max_format_retries = max_format_retries
+        self.metrics = metrics if metrics is not None else MetricsSink()
+        self.last_turn_stats = None
 
-        self.sys_prompt = """
-        You are playing Codenames. The game consists of two teams: Red Team and Blue Team. Each team has a Spymaster and a Guesser.
-        Spymaster: Knows which words belong to their team, the opposing team, neutral words, and the assassin. Gives a one-word clue and a number indicating how many words are related to the clue. Example: "Ocean 2" means two words relate to "Ocean." Only respond with a single word and a number, separated by a space.
-        Guesser: Tries to guess their team's words based on the clue. If they guess correctly, their team scores. If they guess an opposing team's word, the other team gains a point. If they guess a neutral word or an opponent's word, the turn ends. If they guess the assassin word, their team loses immediately. Respond with the number of words specified by the hint. Respond with the words, seperated by a space. Put the words you are most confident in first. Example: 'water boat'.
-        Teams take turns. The goal is to guess all of your team's words before the opposing team while avoiding the assassin. The game ends when a team finds all their words or someone picks the assassin.
-        """
+        assert prompt_mode in {
+            "full",
+            "compact",
+        }, "prompt_mode must be either 'full' or 'compact'"
+        self.prompt_mode = prompt_mode
+        self.sys_prompt = SYS_PROMPT if prompt_mode == "full" else COMPACT_SYS_PROMPT
 
-    def do_turn_spymaster(self, word_assignments):
-        correct_format = False
-        num_tries = 0
-        while not correct_format and num_tries < 5:
-            result = fal_client.subscribe(
-                "fal-ai/any-llm",
-                arguments={
-                    "model": self.model,
-                    "system_prompt": self.sys_prompt,
-                    "prompt": f"""You are the {self.team_color} team's spymaster. Think of a single word clue that allows your teammate to guess as many {self.team_color} words as possible. Avoid potential connections with the other remaining words. Avoid the assassin at all cost. Do not give hints which can easily be confused with the assassin.
+        # Streamed answers are parsed while they arrive and read only up to the
+        # end of the JSON object; streamed guesses are handed to the game one by
+        # one (see do_turn_guesser).
+        # Backends without supports_streaming answer in a single chunk.
+        self.stream = stream
+
+    def query(self, prompt, parse, full_prompt=None, item_key=None, on_item=None, **context):
+        # Transport errors are retried with backoff and count towards the model's
+        # circuit breaker, which is waited out while open (up to the retry
+        # policy's max_circuit_wait); malformed answers are re-prompted straight
+        # away.
+        # full_prompt is the equivalent prompt in full mode, only used to record
+        # how many prompt tokens compact mode saves. When streaming, on_item is
+        # called with every complete string of the item_key array as it arrives
+        # and stops the stream by returning False.
+        breaker = get_circuit_breaker(self.model)
+        prompt_tokens_est = estimate_tokens(self.sys_prompt) + estimate_tokens(prompt)
+        full_prompt_tokens_est = estimate_tokens(SYS_PROMPT) + estimate_tokens(full_prompt or prompt)
+        if self.backend.supports_prompt_caching:
+            context["cache_system_prompt"] = True
+        stats = {
+            "attempts": 0,
+            "retries": 0,
+            "retry_seconds": 0.0,
+            "transport_errors": 0,
+            "format_errors": 0,
+            "queue_seconds": 0.0,
+            "request_seconds": 0.0,
+            "prompt_chars": 0,
+            "response_chars": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "prompt_tokens_est": 0,
+            "full_prompt_tokens_est": 0,
+            "cost": None,
+        }
+        self.last_turn_stats = stats
+        circuit_wait = 0.0
+        while stats["format_errors"] < self.max_format_retries:
+            try:
+                breaker.before_call()
+            except CircuitOpenError as e:
+                delay = self.retry_policy.circuit_delay(e.retry_in)
+                if circuit_wait + delay > self.retry_policy.max_circuit_wait:
+                    raise
+                circuit_wait += delay
+                stats["retry_seconds"] += delay
+                time.sleep(delay)
+                continue
+            stats["attempts"] += 1
+            stats["prompt_tokens_est"] += prompt_tokens_est
+            stats["full_prompt_tokens_est"] += full_prompt_tokens_est
+            record = {
+                "game": current_game.get(),
+                "model": self.model,
+                "role": context["role"],
+                "team": self.team_color,
+                "attempt": stats["attempts"] - 1,
+                "prompt_chars": len(self.sys_prompt) + len(prompt),
+            }
+            queued_at = time.perf_counter()
+            try:
+                with model_slot(self.model), count_in_flight():
+                    started_at = time.perf_counter()
+                    record["queue_seconds"] = started_at - queued_at
+                    try:
+                        if self.stream:
+                            result = self.read_stream(
+                                prompt, item_key, on_item, record, attempt=stats["attempts"] - 1, **context
+                            )
+                        else:
+                            result = self.backend.complete(
+                                self.model,
+                                self.sys_prompt,
+                                prompt,
+                                attempt=stats["attempts"] - 1,
+                                **context,
+                            )
+                    finally:
+                        record["request_seconds"] = time.perf_counter() - started_at
+                        stats["queue_seconds"] += record["queue_seconds"]
+                        stats["request_seconds"] += record["request_seconds"]
+            except BackendError as e:
+                if not (isinstance(e, RateLimitError) and e.retry_after is not None):
+                    breaker.record_failure()
+                stats["transport_errors"] += 1
+                self.metrics.emit({**record, "outcome": "transport_error", "error": str(e)})
+                if not e.retryable or stats["transport_errors"] > self.retry_policy.max_retries:
+                    raise
+                delay = self.retry_policy.delay(stats["transport_errors"] - 1, e.retry_after)
+                logger.warning("%s request failed (%s), retrying in %.1fs", self.model, e, delay)
+                stats["retries"] += 1
+                stats["retry_seconds"] += delay
+                time.sleep(delay)
+                continue
+            breaker.record_success()
+            self.record_usage(record, prompt, result, stats)
+
+            try:
+                parsed = result.get("parsed")
+                output = parse(parsed if parsed is not None else parse_json_output(result["output"]))
+            except Exception as e:
+                logger.warning(
+                    "%s %s did not return the correct format. Got error: %s", self.model, context["role"], e
+                )
+                logger.debug("Got: %s", result["output"])
+                stats["format_errors"] += 1
+                stats["retries"] += 1
+                self.metrics.emit({**record, "outcome": "format_error"})
+                continue
+            self.metrics.emit({**record, "outcome": "ok"})
+            return output
+
+        return None
+
+    def read_stream(self, prompt, item_key, on_item, record, **context):
+        # Reads a streamed answer up to the end of its JSON object. Items that
+        # were handed to on_item are final: if the stream then breaks off, the
+        # items so far are the answer instead of a retry. Items after the one
+        # that stopped the stream are dropped, even when they arrived in the
+        # same chunk.
+        parser = JsonStream(item_key)
+        delivered = []
+        started_at = time.perf_counter()
+        chunks = self.backend.stream(self.model, self.sys_prompt, prompt, **context)
+        try:
+            for chunk in chunks:
+                stopped = False
+                for item in parser.feed(chunk):
+                    record.setdefault("first_item_seconds", time.perf_counter() - started_at)
+                    delivered.append(item)
+                    if on_item is not None and on_item(item) is False:
+                        stopped = True
+                        break
+                if parser.done or stopped:
+                    break
+        except BackendError as e:
+            if not delivered:
+                raise
+            logger.warning("%s stream broke off after %s items: %s", self.model, len(delivered), e)
+        finally:
+            chunks.close()
+
+        parsed = parser.value
+        if delivered:
+            parsed = {**(parsed or {}), item_key: delivered}
+
+        return {"output": parser.text, "parsed": parsed}
+
+    def record_usage(self, record, prompt, result, stats):
+        # Token counts and cost come from the provider when it reports them,
+        # otherwise they are estimated from the text sizes.
+        output = result.get("output") or ""
+        usage = result.get("usage") or {}
+        record["response_chars"] = len(output)
+        record["cached"] = bool(result.get("cached"))
+        record["prompt_tokens"] = usage.get(
+            "prompt_tokens", estimate_tokens(self.sys_prompt) + estimate_tokens(prompt)
+        )
+        record["completion_tokens"] = usage.get("completion_tokens", estimate_tokens(output))
+        record["cost"] = self.metrics.cost(
+            self.model, result, record["prompt_tokens"], record["completion_tokens"]
+        )
+        for key in ("prompt_chars", "response_chars", "prompt_tokens", "completion_tokens"):
+            stats[key] += record[key]
+        if record["cost"] is not None:
+            stats["cost"] = (stats["cost"] or 0.0) + record["cost"]
+
+    def spymaster_prompt(self, word_assignments, prompt_mode):
+        if prompt_mode == "compact":
+            # Own words first, empty categories (all words revealed) left out.
+            opponent_color = "blue" if self.team_color == "red" else "red"
+            board = "\n".join(
+                f"{color}: {', '.join(word_assignments[color])}"
+                for color in (self.team_color, opponent_color, "neutral", "assassin")
+                if word_assignments.get(color)
+            )
+            return f"""You are the {self.team_color} spymaster. Give a one-word clue (not a board word) linking as many {self.team_color} words as possible and no others, never the assassin.
+{board}
+Reply only with JSON: {{"hint": "clue", "num_cards": n}}"""
+
+        return f"""You are the {self.team_color} team's spymaster. Think of a single word clue that allows your teammate to guess as many {self.team_color} words as possible. Avoid potential connections with the other remaining words. Avoid the assassin at all cost. Do not give hints which can easily be confused with the assassin.
 The possible words and their assignments are as follows: {str(word_assignments)}.
 
 Respond strictly in JSON format with the following structure:
@@ -57,42 +317,14 @@ Respond strictly in JSON format with the following structure:
     "num_cards": number
 }}
 
-Your hint must not be a word already in the word list. Always think of a new word. ONLY RESPOND WITH THE JSON OBJECT NOTHING ELSE""",
-                },
-            )
-            try:
-                # gemini and gpt return a response like ```json{...}```, while llama and claude do not. This filters the response.
-                cleaned_output = re.sub(
-                    r"^```json|```$",
-                    "",
-                    result["output"].strip("```json").strip("```").strip(),
-                ).strip()
-                output = json.loads(cleaned_output)
-                hint = output["hint"]
-                num_cards = output["num_cards"]
-                correct_format = True
-            except Exception as e:
-                print(
-                    "[WARNING] spymaster did not return the correct format. Got error:",
-                    e,
-                    "Got:",
-                    result["output"],
-                )
-                num_tries += 1
-                hint, num_cards = "", 0
-
-        return hint, num_cards
-
-    def do_turn_guesser(self, clue_word, num_cards, left_over_words):
-        correct_format = False
-        num_tries = 0
-        while not correct_format and num_tries < 5:
-            result = fal_client.subscribe(
-                "fal-ai/any-llm",
-                arguments={
-                    "model": self.model,
-                    "system_prompt": self.sys_prompt,
-                    "prompt": f"""You are the {self.team_color} team's guesser. The received clue word is "{clue_word}".
+Your hint must not be a word already in the word list. Always think of a new word. ONLY RESPOND WITH THE JSON OBJECT NOTHING ELSE"""
+
+    def guesser_prompt(self, clue_word, num_cards, left_over_words, prompt_mode):
+        if prompt_mode == "compact":
+            return f"""You are the {self.team_color} guesser. Clue: "{clue_word}" for {num_cards} words. Board: {', '.join(left_over_words)}
+Reply only with JSON: {{"guesses": ["word", ...]}} using board words, most certain first."""
+
+        return f"""You are the {self.team_color} team's guesser. The received clue word is "{clue_word}".
 You must guess {num_cards} words based on this clue. Choose from any of the following words: {str(left_over_words)}.
 
 Respond strictly in JSON format with the following structure:
@@ -100,27 +332,38 @@ Respond strictly in JSON format with the following structure:
     "guesses": ["word1", "word2", "word3", ...]
 }}
 
-Make sure the words you guess are in the allowed words, never make up your own words and never guess the same word as the hint. Words must be in order from most certain to least certain. ONLY RESPOND WITH THE JSON OBJECT NOTHING ELSE""",
-                },
-            )
-            try:
-                # gemini and gpt return a response like ```json{...}```, while llama and claude do not. This filters the response.
-                cleaned_output = re.sub(
-                    r"^```json|```$",
-                    "",
-                    result["output"].strip("```json").strip("```").strip(),
-                ).strip()
-                output = json.loads(cleaned_output)
-                guesses = output["guesses"]
-                correct_format = True
-            except Exception as e:
-                print(
-                    "[WARNING] guesser did not return the correct format. Got error:",
-                    e,
-                    "Got:",
-                    result["output"],
-                )
-                num_tries += 1
-                guesses = []
+Make sure the words you guess are in the allowed words, never make up your own words and never guess the same word as the hint. Words must be in order from most certain to least certain. ONLY RESPOND WITH THE JSON OBJECT NOTHING ELSE"""
+
+    def do_turn_spymaster(self, word_assignments):
+        output = self.query(
+            self.spymaster_prompt(word_assignments, self.prompt_mode),
+            lambda output: (output["hint"], output["num_cards"]),
+            full_prompt=self.spymaster_prompt(word_assignments, "full"),
+            role="spymaster",
+            team_color=self.team_color,
+            word_assignments=word_assignments,
+        )
+        if output is None:
+            return "", 0
+
+        return output
+
+    def do_turn_guesser(self, clue_word, num_cards, left_over_words, on_guess=None):
+        # When streaming, on_guess is called with every guess as soon as it is
+        # read and returns False to stop reading further guesses.
+        guesses = self.query(
+            self.guesser_prompt(clue_word, num_cards, left_over_words, self.prompt_mode),
+            lambda output: output["guesses"],
+            full_prompt=self.guesser_prompt(clue_word, num_cards, left_over_words, "full"),
+            item_key="guesses",
+            on_item=on_guess,
+            role="guesser",
+            team_color=self.team_color,
+            clue_word=clue_word,
+            num_cards=num_cards,
+            left_over_words=left_over_words,
+        )
+        if guesses is None:
+            return []
 
         return guesses
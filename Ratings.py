@@ -0,0 +1,186 @@
+import argparse
+
+import numpy as np
+
+ELO_BASE = 1500.0
+ELO_SCALE = 400.0
+
+
+def elo_expected(rating, other):
+    return 1.0 / (1.0 + 10 ** ((other - rating) / ELO_SCALE))
+
+
+class Ratings:
+    # Ratings updated one game at a time: Elo per model and the head-to-head
+    # win counts that Bradley-Terry strengths and bootstrap intervals are
+    # fitted on. Like GameStats the state is plain JSON, so it can be persisted
+    # and extended with new games only. Per-role strengths are in
+    # Analytics.GameTable.role_attribution. Self-play games say nothing about
+    # relative strength and are skipped.
+    def __init__(self, state=None, k=16.0):
+        state = state or {}
+        self.k = k
+        self.elo = state.get("elo", {})
+        self.wins = state.get("wins", {})
+
+    def update(self, game):
+        if game.get("winner") not in ("red", "blue") or game["red"] == game["blue"]:
+            return
+        winner = game["winner"]
+        loser = "blue" if winner == "red" else "red"
+
+        a, b = game[winner], game[loser]
+        self.wins.setdefault(a, {})
+        self.wins.setdefault(b, {})
+        self.wins[a][b] = self.wins[a].get(b, 0) + 1
+
+        ra, rb = self.elo.get(a, ELO_BASE), self.elo.get(b, ELO_BASE)
+        delta = self.k * (1.0 - elo_expected(ra, rb))
+        self.elo[a] = ra + delta
+        self.elo[b] = rb - delta
+
+    def result_matrix(self):
+        # Returns the models and wins[i, j], the number of wins of i over j.
+        models = sorted(self.wins)
+        index = {model: i for i, model in enumerate(models)}
+        wins = np.zeros((len(models), len(models)))
+        for model, row in self.wins.items():
+            for other, count in row.items():
+                wins[index[model], index[other]] = count
+
+        return models, wins
+
+    def to_dict(self):
+        return {"elo": self.elo, "wins": self.wins}
+
+
+class PairedResults:
+    # Scores duplicate games (see Scheduler.duplicate_schedule) per pair of
+    # games on the same board: a model that wins both the original and the
+    # mirrored game scores 1, a split scores 0.5 for both. Board and start team
+    # luck cancel out within a pair, so paired scores need far fewer games than
+    # raw win rates. The first game of a pair waits in `pending` until its
+    # mirror arrives.
+    def __init__(self, state=None):
+        state = state or {}
+        self.pending = state.get("pending", {})
+        self.scores = state.get("scores", {})
+
+    def update(self, game):
+        if game.get("pair_id") is None or game.get("winner") not in ("red", "blue") or game["red"] == game["blue"]:
+            return
+        key = str(game["pair_id"])
+        winner = game[game["winner"]]
+        first = self.pending.pop(key, None)
+        if first is None or {first["red"], first["blue"]} != {game["red"], game["blue"]}:
+            self.pending[key] = {"red": game["red"], "blue": game["blue"], "winner": winner}
+            return
+
+        for model in (game["red"], game["blue"]):
+            score = ((first["winner"] == model) + (winner == model)) / 2
+            entry = self.scores.setdefault(model, {"pairs": 0, "sum": 0.0, "sum_sq": 0.0})
+            entry["pairs"] += 1
+            entry["sum"] += score
+            entry["sum_sq"] += score**2
+
+    def summary(self):
+        # Mean paired score and its standard error per model.
+        summary = {}
+        for model, entry in self.scores.items():
+            n = entry["pairs"]
+            mean = entry["sum"] / n
+            variance = max(entry["sum_sq"] / n - mean**2, 0.0)
+            summary[model] = {"pairs": n, "score": mean, "stderr": (variance / max(n - 1, 1)) ** 0.5}
+
+        return summary
+
+    def to_dict(self):
+        return {"pending": self.pending, "scores": self.scores}
+
+
+def bradley_terry(wins, prior=0.5, num_iters=500, tol=1e-8):
+    # Fits Bradley-Terry strengths with the MM algorithm (Hunter, 2004). wins
+    # has shape (..., n, n), so a stack of result matrices (e.g. bootstrap
+    # samples) is fitted at once. `prior` virtual wins each way on every played
+    # pair keep models without wins or losses finite. Returns ratings on the
+    # Elo scale, centered on ELO_BASE.
+    wins = np.asarray(wins, dtype=float)
+    if wins.shape[-1] == 0:
+        return np.zeros(wins.shape[:-1])
+    games = wins + np.swapaxes(wins, -1, -2)
+    wins = wins + prior * (games > 0)
+    games = games + 2 * prior * (games > 0)
+    total_wins = wins.sum(axis=-1)
+
+    strength = np.ones(wins.shape[:-1])
+    for _ in range(num_iters):
+        pair_sum = strength[..., :, None] + strength[..., None, :]
+        new = total_wins / np.maximum((games / pair_sum).sum(axis=-1), 1e-300)
+        new = new / np.exp(np.log(np.maximum(new, 1e-300)).mean(axis=-1, keepdims=True))
+        converged = np.max(np.abs(new - strength)) < tol
+        strength = new
+        if converged:
+            break
+
+    return ELO_BASE + ELO_SCALE * np.log10(np.maximum(strength, 1e-300))
+
+
+def bootstrap_intervals(wins, num_samples=1000, confidence=0.95, seed=None, prior=0.5):
+    # Resamples every pair's results from a binomial with its win rate, smoothed
+    # by the same `prior` as the fit (so a 1-0 pair still varies), and refits
+    # all samples in one vectorized Bradley-Terry fit. Returns the lower and
+    # upper bound of each model's rating.
+    rng = np.random.default_rng(seed)
+    wins = np.asarray(wins, dtype=float)
+    games = wins + wins.T
+    upper = np.triu(np.ones_like(wins, dtype=bool), k=1)
+    rate = (wins + prior) / (games + 2 * prior)
+
+    samples = np.zeros((num_samples,) + wins.shape)
+    pair_wins = rng.binomial(games[upper].astype(np.int64), rate[upper], size=(num_samples, upper.sum()))
+    samples[:, upper] = pair_wins
+    samples = samples + np.swapaxes(np.where(upper, games - samples, 0), -1, -2)
+
+    ratings = bradley_terry(samples, prior)
+    alpha = (1 - confidence) / 2
+
+    return np.quantile(ratings, alpha, axis=0), np.quantile(ratings, 1 - alpha, axis=0)
+
+
+def predicted_win_rates(ratings):
+    ratings = np.asarray(ratings, dtype=float)
+
+    return elo_expected(ratings[:, None], ratings[None, :])
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Rate the models in the game logs.")
+    parser.add_argument(
+        "--log_dir", type=str, default="logs/", help="Directory with game logs."
+    )
+    parser.add_argument(
+        "--bootstrap",
+        type=int,
+        default=1000,
+        help="Number of bootstrap samples for the confidence intervals.",
+    )
+    parser.add_argument("--seed", type=int, default=None)
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    from plot import iter_games
+
+    args = parse_args()
+    ratings = Ratings()
+    for game in iter_games(args.log_dir, columns=["red", "blue", "winner"], with_turns=False):
+        ratings.update(game)
+
+    models, wins = ratings.result_matrix()
+    strengths = bradley_terry(wins)
+    lower, upper = bootstrap_intervals(wins, args.bootstrap, seed=args.seed)
+    print(f"{'model':40} {'elo':>7} {'bt':>7}   95% interval")
+    for i in np.argsort(-strengths):
+        model = models[i]
+        print(f"{model:40} {ratings.elo[model]:7.0f} {strengths[i]:7.0f}   [{lower[i]:.0f}, {upper[i]:.0f}]")
@@ -0,0 +1,96 @@
+import time
+import random
+import logging
+import threading
+
+from Backend import BackendError
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(BackendError):
+    def __init__(self, model, retry_in):
+        super().__init__(
+            f"Circuit breaker for {model} is open, retry in {retry_in:.1f}s",
+            retryable=False,
+        )
+        self.model = model
+        self.retry_in = retry_in
+
+
+class RetryPolicy:
+    # Exponential backoff with full jitter. A retry-after hint from the provider
+    # is used as a lower bound on the delay. max_circuit_wait bounds how long a
+    # call waits in total for an open circuit breaker before giving up.
+    def __init__(self, max_retries=5, base_delay=1.0, max_delay=60.0, max_circuit_wait=120.0, seed=None):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_circuit_wait = max_circuit_wait
+        self.rng = random.Random(seed)
+
+    def delay(self, retry_number, retry_after=None):
+        cap = min(self.max_delay, self.base_delay * 2**retry_number)
+        delay = self.rng.uniform(0, cap)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+
+        return delay
+
+    def circuit_delay(self, retry_in):
+        # Waits out an open circuit, with jitter so waiting callers do not all
+        # retry at the same moment once it half-opens.
+        return min(retry_in, self.max_delay) + self.rng.uniform(0, self.base_delay)
+
+
+class CircuitBreaker:
+    # Opens after failure_threshold consecutive transport failures. While open,
+    # calls fail fast (Player waits them out); after reset_timeout a single trial
+    # call is let through and its outcome decides whether the circuit closes
+    # again. Rate limits that come with a retry-after are not failures of the
+    # model and are not recorded, so a trial may end without an outcome; another
+    # trial is then let through reset_timeout after it started.
+    def __init__(self, model, failure_threshold=5, reset_timeout=30.0):
+        self.model = model
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.lock = threading.Lock()
+        self.state = "closed"
+        self.num_failures = 0
+        self.opened_at = 0.0
+
+    def before_call(self):
+        with self.lock:
+            if self.state == "closed":
+                return
+            elapsed = time.monotonic() - self.opened_at
+            if elapsed >= self.reset_timeout:
+                self.state = "half_open"
+                self.opened_at = time.monotonic()
+                return
+            raise CircuitOpenError(self.model, max(0.0, self.reset_timeout - elapsed))
+
+    def record_success(self):
+        with self.lock:
+            self.state = "closed"
+            self.num_failures = 0
+
+    def record_failure(self):
+        with self.lock:
+            self.num_failures += 1
+            if self.state == "half_open" or self.num_failures >= self.failure_threshold:
+                if self.state != "open":
+                    logger.warning("Opening circuit breaker for %s", self.model)
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+
+_circuit_breakers = {}
+_circuit_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(model):
+    with _circuit_breakers_lock:
+        if model not in _circuit_breakers:
+            _circuit_breakers[model] = CircuitBreaker(model)
+        return _circuit_breakers[model]
@@ -0,0 +1,138 @@
+import random
+
+from Ratings import Ratings, bradley_terry, predicted_win_rates
+
+
+def round_robin_rounds(players):
+    # Circle method: every round pairs each player with another one, and every
+    # pair meets exactly once over len(players) - 1 rounds (a bye for odd counts).
+    # As in a Berger table the pair of the fixed first player flips every round
+    # and the other pairs alternate, so every player is first about half of the
+    # time in any prefix of the rounds.
+    players = list(players)
+    if len(players) % 2 == 1:
+        players.append(None)
+    rounds = []
+    for r in range(len(players) - 1):
+        half = len(players) // 2
+        pairs = list(zip(players[:half], reversed(players[half:])))
+        pairs = [pair[::-1] if (r if i == 0 else i) % 2 == 1 else pair for i, pair in enumerate(pairs)]
+        rounds.append([(a, b) for a, b in pairs if a is not None and b is not None])
+        players = [players[0], players[-1]] + players[1:-1]
+
+    return rounds
+
+
+def balanced_schedule(players, num_games, seed=None):
+    # Cycles through full round robins. Over four cycles every pair plays every
+    # combination of colors and start team once, and any prefix of the schedule
+    # is close to balanced: the start team alternates every two games within a
+    # round, out of step with the colors of the round's pairs.
+    rng = random.Random(seed)
+    rounds = round_robin_rounds(players)
+    games = []
+    cycle = 0
+    while len(games) < num_games:
+        swap_colors = cycle % 2 == 1
+        for round_pairs in rounds:
+            for i, (a, b) in enumerate(round_pairs):
+                start_team = "red" if (i // 2 + cycle // 2) % 2 == 0 else "blue"
+                red_team, blue_team = (b, a) if swap_colors else (a, b)
+                games.append(
+                    {
+                        "red": red_team,
+                        "blue": blue_team,
+                        "start_team": start_team,
+                        "seed": rng.randrange(2**32),
+                    }
+                )
+        cycle += 1
+
+    return games[:num_games]
+
+
+def duplicate_schedule(games):
+    # Plays every board twice: as scheduled and mirrored, with the models
+    # swapping colors on the same board (same words and start team), so each
+    # model gets the position its opponent had. Both games share the board
+    # seed as pair_id.
+    schedule = []
+    for game in games:
+        schedule.append({**game, "pair_id": game["seed"], "mirrored": False})
+        schedule.append(
+            {**game, "red": game["blue"], "blue": game["red"], "pair_id": game["seed"], "mirrored": True}
+        )
+
+    return schedule
+
+
+def pair_results(games):
+    # Wins of the first model of each (sorted) pair and games per pair.
+    results = {}
+    for game in games:
+        if game.get("winner") not in ("red", "blue"):
+            continue
+        a, b = sorted((game["red"], game["blue"]))
+        wins, total = results.get((a, b), (0, 0))
+        results[(a, b)] = (wins + (game[game["winner"]] == a), total + 1)
+
+    return results
+
+
+class AdaptiveScheduler:
+    # Allocates games to the pairs whose head-to-head result is most uncertain:
+    # the variance of a Beta posterior on the win probability. Its prior is
+    # worth two games at the win rate predicted by Bradley-Terry ratings over
+    # all results, so pairs that never met borrow from common opponents. The
+    # variance is largest for pairs that are close and rarely played, so games
+    # go where they tell most about the ranking. Colors and start team
+    # alternate per pair.
+    def __init__(self, players, seed=None):
+        self.players = list(players)
+        self.rng = random.Random(seed)
+        self.pairs = [
+            (a, b) for i, a in enumerate(sorted(self.players)) for b in sorted(self.players)[i + 1 :]
+        ]
+
+    def uncertainty(self, wins, total, prior_rate=0.5):
+        alpha, beta = 2 * prior_rate + wins, 2 * (1 - prior_rate) + total - wins
+        return alpha * beta / ((alpha + beta) ** 2 * (alpha + beta + 1))
+
+    def prior_rates(self, games):
+        ratings = Ratings()
+        for game in games:
+            ratings.update(game)
+        models, wins = ratings.result_matrix()
+        rates = predicted_win_rates(bradley_terry(wins)) if models else None
+        index = {model: i for i, model in enumerate(models)}
+        return {
+            (a, b): rates[index[a], index[b]] if a in index and b in index else 0.5
+            for a, b in self.pairs
+        }
+
+    def next_games(self, games, num_games):
+        results = pair_results(games)
+        prior_rates = self.prior_rates(games)
+        planned = {pair: results.get(pair, (0, 0)) for pair in self.pairs}
+        schedule = []
+        for _ in range(num_games):
+            # Each scheduled game is counted as half a win for both sides, so a
+            # batch spreads over several uncertain pairs.
+            pair = max(
+                self.pairs,
+                key=lambda p: (self.uncertainty(*planned[p], prior_rates[p]), self.rng.random()),
+            )
+            wins, total = planned[pair]
+            planned[pair] = (wins + 0.5, total + 1)
+            a, b = pair
+            red_team, blue_team = (a, b) if total % 2 == 0 else (b, a)
+            schedule.append(
+                {
+                    "red": red_team,
+                    "blue": blue_team,
+                    "start_team": "red" if int(total) // 2 % 2 == 0 else "blue",
+                    "seed": self.rng.randrange(2**32),
+                }
+            )
+
+        return schedule
@@ -0,0 +1,240 @@
+import os
+import json
+import argparse
+from collections import OrderedDict
+
+import numpy as np
+
+from Game import load_wordlist
+
+
+class SimilarityIndex:
+    # Precomputed cosine similarities between clue words (rows) and board words
+    # (columns), for analysing logged turns without any model calls. Rows cover
+    # the board vocabulary and every clue seen in the logs that has a vector.
+    # Saved as <path>.npy (float32 matrix, memory-mapped on load),
+    # <path>.rows and <path>.cols (one word per line). The (clues x board)
+    # slice of a board is cached, so both games of a mirrored pair and replays
+    # of a board share it.
+    def __init__(self, rows, cols, sims, cache_size=128):
+        self.rows = list(rows)
+        self.cols = list(cols)
+        self.sims = sims
+        self.row_index = {word: i for i, word in enumerate(self.rows)}
+        self.col_index = {word: i for i, word in enumerate(self.cols)}
+        self.cache_size = cache_size
+        self.board_cache = OrderedDict()
+
+    @classmethod
+    def build(cls, word_vectors, board_words, clue_words=()):
+        cols = [w for w in dict.fromkeys(board_words) if w in word_vectors]
+        rows = list(cols)
+        for word in dict.fromkeys(clue_words):
+            key = word if word in word_vectors else word.lower()
+            if key in word_vectors and key not in rows:
+                rows.append(key)
+        col_vectors, _ = word_vectors.lookup(cols)
+        row_vectors, _ = word_vectors.lookup(rows)
+        sims = np.asarray(row_vectors, dtype=np.float32) @ np.asarray(col_vectors, dtype=np.float32).T
+
+        return cls(rows, cols, sims)
+
+    def save(self, path):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.save(f"{path}.npy", np.ascontiguousarray(self.sims, dtype=np.float32))
+        for suffix, words in (("rows", self.rows), ("cols", self.cols)):
+            with open(f"{path}.{suffix}", "w", encoding="utf-8") as f:
+                f.write("\n".join(words))
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        sims = np.load(f"{path}.npy", mmap_mode="r" if mmap else None)
+        words = {}
+        for suffix in ("rows", "cols"):
+            with open(f"{path}.{suffix}", "r", encoding="utf-8") as f:
+                words[suffix] = f.read().splitlines()
+
+        return cls(words["rows"], words["cols"], sims)
+
+    @staticmethod
+    def exists(path):
+        return all(os.path.exists(f"{path}.{suffix}") for suffix in ("npy", "rows", "cols"))
+
+    def row(self, clue):
+        clue = str(clue).strip()
+        return self.row_index.get(clue, self.row_index.get(clue.lower(), -1))
+
+    def board_slice(self, board_words):
+        # Returns the board words that are in the index and their (clues x
+        # words) similarity slice.
+        key = frozenset(board_words)
+        if key in self.board_cache:
+            self.board_cache.move_to_end(key)
+            return self.board_cache[key]
+
+        known = sorted(w for w in key if w in self.col_index)
+        entry = (known, np.ascontiguousarray(self.sims[:, [self.col_index[w] for w in known]]))
+        self.board_cache[key] = entry
+        while len(self.board_cache) > self.cache_size:
+            self.board_cache.popitem(last=False)
+
+        return entry
+
+    def annotate_game(self, game):
+        # One record per spymaster turn, computed for all turns of the game at
+        # once. Similarities are ranked among the words still on the board when
+        # the clue was given (rank 1 is the most similar):
+        #   own_ranks        ranks of the num_cards own words closest to the clue
+        #   ambiguity        other words ranked above the last of those
+        #   assassin_rank    rank of the assassin
+        #   assassin_margin  similarity of the assassin minus that of the last
+        #                    targeted own word; above 0 the assassin is closer
+        #   guess_ranks      ranks of the words actually guessed
+        # Turns whose clue has no vector only get "known": False.
+        turns = game["turn_history"]
+        board_words = [w for words in game["word_assignments"].values() for w in words]
+        known, board_sims = self.board_slice(board_words)
+        if not turns or not known:
+            return []
+        column = {w: i for i, w in enumerate(known)}
+        owners = {w: color for color, words in game["word_assignments"].items() for w in words}
+        owner = np.array([owners[w] for w in known])
+
+        # Words on the board before every turn, replaying the reveals.
+        on_board = np.ones((len(turns), len(known)), dtype=bool)
+        revealed = set()
+        for t, turn in enumerate(turns):
+            on_board[t, [column[w] for w in revealed if w in column]] = False
+            for guess in turn["guesser"]:
+                if guess not in owners or guess in revealed:
+                    break
+                revealed.add(guess)
+                if owners[guess] != turn["team"]:
+                    break
+
+        rows = np.array([self.row(turn["spymaster"][0]) for turn in turns])
+        sims = np.where(on_board, board_sims[np.maximum(rows, 0)], -np.inf)
+        ranks = np.empty_like(on_board, dtype=np.int64)
+        np.put_along_axis(ranks, np.argsort(-sims, axis=1), np.arange(1, len(known) + 1), axis=1)
+
+        records = []
+        for t, turn in enumerate(turns):
+            hint, num_cards = turn["spymaster"]
+            record = {"turn": t, "team": turn["team"], "clue": hint, "known": bool(rows[t] >= 0)}
+            records.append(record)
+            if rows[t] < 0:
+                continue
+            remaining = on_board[t]
+            own = np.flatnonzero(remaining & (owner == turn["team"]))
+            if len(own) == 0:
+                continue
+            try:
+                num_cards = max(int(num_cards), 1)
+            except (TypeError, ValueError):
+                num_cards = 1
+            own_ranks = np.sort(ranks[t, own])[: min(num_cards, len(own))]
+            last_target = own[np.argsort(ranks[t, own])[len(own_ranks) - 1]]
+            record["own_ranks"] = own_ranks.tolist()
+            record["ambiguity"] = int(own_ranks[-1] - len(own_ranks))
+            assassin = np.flatnonzero(remaining & (owner == "assassin"))
+            if len(assassin):
+                record["assassin_rank"] = int(ranks[t, assassin[0]])
+                record["assassin_margin"] = float(sims[t, assassin[0]] - sims[t, last_target])
+            record["guess_ranks"] = [
+                int(ranks[t, column[g]]) if g in column and remaining[column[g]] else None
+                for g in turn["guesser"]
+            ]
+
+        return records
+
+
+def logged_clues(games):
+    return [str(turn["spymaster"][0]) for game in games for turn in game["turn_history"]]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Annotate logged spymaster turns with target ranks and assassin risk."
+    )
+    parser.add_argument(
+        "--log_dir", type=str, default="logs/", help="Directory with game logs."
+    )
+    parser.add_argument(
+        "--index",
+        type=str,
+        default="cache/similarity_index",
+        help="Path prefix of the similarity index, built here from --vectors if missing or missing logged clues.",
+    )
+    parser.add_argument(
+        "--vectors",
+        type=str,
+        default=None,
+        help="Path prefix of the word vectors (see Embeddings.py), needed to build the index.",
+    )
+    parser.add_argument(
+        "--wordlist_path",
+        type=str,
+        default="assets/words.txt",
+        help="Board words, the index columns.",
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="Write one JSON line per annotated turn here.",
+    )
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    from plot import iter_games
+    from Embeddings import WordVectors
+
+    args = parse_args()
+    clues = logged_clues(iter_games(args.log_dir))
+    index = None
+    if SimilarityIndex.exists(args.index):
+        index = SimilarityIndex.load(args.index)
+        # Clues from logs added since the index was built are rebuilt in when
+        # the vectors are at hand, clues without a vector stay unknown.
+        missing = {clue for clue in clues if index.row(clue) < 0}
+        word_vectors = WordVectors.load(args.vectors) if missing and args.vectors else None
+        if word_vectors is not None and any(c in word_vectors or c.lower() in word_vectors for c in missing):
+            clues = index.rows + clues
+            index = None
+        elif missing:
+            hint = "they have no vector" if args.vectors else "pass --vectors to add them"
+            print(f"[WARNING] {len(missing)} logged clues are not in the index at {args.index}, {hint}")
+    else:
+        assert args.vectors, f"no index at {args.index}, pass --vectors to build it"
+        word_vectors = WordVectors.load(args.vectors)
+    if index is None:
+        index = SimilarityIndex.build(word_vectors, load_wordlist(args.wordlist_path), clues)
+        index.save(args.index)
+        print(f"Built a {len(index.rows)} x {len(index.cols)} similarity index at {args.index}")
+
+    output = open(args.output, "w") if args.output else None
+    summary = {}
+    for game_number, game in enumerate(iter_games(args.log_dir)):
+        for record in index.annotate_game(game):
+            model = game[record["team"]]
+            stats = summary.setdefault(model, {"turns": 0, "known": 0, "ambiguity": 0, "assassin_closer": 0})
+            stats["turns"] += 1
+            if "ambiguity" in record:
+                stats["known"] += 1
+                stats["ambiguity"] += record["ambiguity"]
+                stats["assassin_closer"] += record.get("assassin_margin", -1.0) > 0
+            if output is not None:
+                output.write(json.dumps({"game": game.get("game_id", game_number), "model": model, **record}) + "\n")
+    if output is not None:
+        output.close()
+
+    print(f"{'model':40} {'turns':>6} {'known':>6} {'ambiguity':>10} {'assassin closer':>16}")
+    for model, stats in sorted(summary.items()):
+        known = max(stats["known"], 1)
+        print(
+            f"{model:40} {stats['turns']:6} {stats['known']:6} {stats['ambiguity'] / known:10.2f}"
+            f" {stats['assassin_closer'] / known:16.1%}"
+        )
@@ -0,0 +1,96 @@
+import os
+import json
+import random
+
+
+class Tournament:
+    # A tournament plan (matchups and seeds for every game) persisted in a
+    # directory, so an interrupted run can be resumed:
+    #   plan.json        the schedule, written once
+    #   completed.jsonl  one line per finished game
+    #   checkpoints/     per-turn state of unfinished games
+    def __init__(self, tournament_dir):
+        self.tournament_dir = tournament_dir
+        with open(self.plan_path(tournament_dir), "r") as f:
+            self.plan = json.load(f)
+        self.completed = {}
+        completed_path = os.path.join(tournament_dir, "completed.jsonl")
+        if os.path.exists(completed_path):
+            with open(completed_path, "r") as f:
+                for line in f:
+                    if line.endswith("\n"):
+                        entry = json.loads(line)
+                        self.completed[entry["index"]] = entry["log"]
+
+    @staticmethod
+    def plan_path(tournament_dir):
+        return os.path.join(tournament_dir, "plan.json")
+
+    @classmethod
+    def exists(cls, tournament_dir):
+        return os.path.exists(cls.plan_path(tournament_dir))
+
+    @classmethod
+    def create(cls, tournament_dir, games, **settings):
+        # games are dicts with at least "red", "blue" and "seed".
+        os.makedirs(os.path.join(tournament_dir, "checkpoints"), exist_ok=True)
+        plan = {
+            "settings": settings,
+            "games": [{"index": i, **game} for i, game in enumerate(games)],
+        }
+        write_json_atomic(cls.plan_path(tournament_dir), plan)
+
+        return cls(tournament_dir)
+
+    @property
+    def games(self):
+        return self.plan["games"]
+
+    def pending_games(self):
+        return [game for game in self.games if game["index"] not in self.completed]
+
+    def mark_completed(self, index, log):
+        with open(os.path.join(self.tournament_dir, "completed.jsonl"), "a") as f:
+            f.write(json.dumps({"index": index, "log": log}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.completed[index] = log
+        checkpoint_path = self.checkpoint_path(index)
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+
+    def checkpoint_path(self, index):
+        return os.path.join(self.tournament_dir, "checkpoints", f"game_{index}.json")
+
+    def save_checkpoint(self, index, game):
+        write_json_atomic(
+            self.checkpoint_path(index),
+            {"seed": game.seed, "turn_history": game.turn_history},
+        )
+
+    def load_checkpoint(self, index):
+        checkpoint_path = self.checkpoint_path(index)
+        if not os.path.exists(checkpoint_path):
+            return None
+        with open(checkpoint_path, "r") as f:
+            return json.load(f)
+
+
+def write_json_atomic(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def random_schedule(players, num_games, seed=None):
+    rng = random.Random(seed)
+    matchups = [rng.sample(players, 2) for _ in range(num_games)]
+    seeds = [rng.randrange(2**32) for _ in range(num_games)]
+
+    return [
+        {"red": red_team, "blue": blue_team, "seed": game_seed}
+        for (red_team, blue_team), game_seed in zip(matchups, seeds)
+    ]
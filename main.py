@@ -1,20 +1,42 @@
 import os
 import json
-import random
+import logging
 import argparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 
 from Game import CodeNamesGame
-from Player import Player, ALLOWED_PLAYERS
+from LogStore import LogStore, list_json_logs
+from Tournament import Tournament, random_schedule
+from Scheduler import AdaptiveScheduler, balanced_schedule, duplicate_schedule
+from Cache import ResponseCache
+from Metrics import MetricsSink, load_prices
+from Backend import BatchingBackend, CachedBackend, get_backend
+from Embeddings import WordVectors
+from ClueSearch import ClueSearch
+from LocalPlayer import EmbeddingPlayer, LOCAL_PLAYERS
+from Logger import Progress, setup_logging
+from Player import Player, ALLOWED_PLAYERS, in_flight_calls, set_max_in_flight_per_model
 
 load_dotenv()
 
-def get_teams(red_team, blue_team):
-    red_spymaster = Player("red", "spymaster", red_team)
-    red_guesser = Player("red", "guesser", red_team)
+logger = logging.getLogger(__name__)
 
-    blue_spymaster = Player("blue", "spymaster", blue_team)
-    blue_guesser = Player("blue", "guesser", blue_team)
+
+def get_player(team_color, role, model, player_options=None, clue_search=None):
+    # player_options are passed on to Player (backend, metrics, ...).
+    if model in LOCAL_PLAYERS:
+        assert clue_search is not None, "local players need --vectors"
+        return EmbeddingPlayer(team_color, role, clue_search)
+
+    return Player(team_color, role, model, **(player_options or {}))
+
+def get_teams(red_team, blue_team, player_options=None, clue_search=None):
+    red_spymaster = get_player("red", "spymaster", red_team, player_options, clue_search)
+    red_guesser = get_player("red", "guesser", red_team, player_options, clue_search)
+
+    blue_spymaster = get_player("blue", "spymaster", blue_team, player_options, clue_search)
+    blue_guesser = get_player("blue", "guesser", blue_team, player_options, clue_search)
 
     return red_spymaster, red_guesser, blue_spymaster, blue_guesser
 
@@ -27,6 +49,148 @@ def get_log_path(log_dir="logs/"):
 
     return os.path.join(log_dir, f"game_{next_number}.json")
 
+def write_json_log(log_data, log_dir="logs/"):
+    log_path = get_log_path(log_dir)
+    with open(log_path, "w") as f:
+        json.dump(log_data, f)
+
+    return log_path
+
+def get_log_writer(log_format, log_dir="logs/"):
+    if log_format == "json":
+        return lambda log_data: write_json_log(log_data, log_dir)
+    # Readers only read the store once there is one, so legacy logs next to it
+    # would be dropped.
+    assert LogStore.exists(log_dir) or not list_json_logs(log_dir), (
+        f"{log_dir} holds game_N.json logs, convert them with LogStore.py or pass --log_format json"
+    )
+    store = LogStore(log_dir)
+    return lambda log_data: f"{log_dir} (game {store.append(log_data)})"
+
+def play_game(game_spec, player_options=None, clue_search=None, tournament=None):
+    # game_spec holds "red", "blue" and optionally "seed", "start_team",
+    # "board" (word assignments and start team of a fixed board), "index"
+    # (position in a tournament plan, used for per-turn checkpoints) and
+    # "pair_id" and "mirrored" for duplicate games.
+    red_team, blue_team = game_spec["red"], game_spec["blue"]
+    red_spymaster, red_guesser, blue_spymaster, blue_guesser = get_teams(
+        red_team, blue_team, player_options, clue_search
+    )
+
+    word_assignments, start_team = game_spec.get("board") or (None, game_spec.get("start_team"))
+    on_turn = None
+    if tournament is not None:
+        on_turn = lambda game: tournament.save_checkpoint(game_spec["index"], game)
+    game = CodeNamesGame(
+        red_spymaster=red_spymaster,
+        red_guesser=red_guesser,
+        blue_spymaster=blue_spymaster,
+        blue_guesser=blue_guesser,
+        word_assignments=word_assignments,
+        start_team=start_team,
+        seed=game_spec.get("seed"),
+        on_turn=on_turn,
+        mirrored=game_spec.get("mirrored", False),
+    )
+    if tournament is not None:
+        checkpoint = tournament.load_checkpoint(game_spec["index"])
+        if checkpoint is not None:
+            logger.info("Resuming game %s after %s turns", game_spec["index"], len(checkpoint["turn_history"]))
+            game.restore(checkpoint["turn_history"])
+    game.run()
+
+    log_data = {
+        "blue": blue_team,
+        "red": red_team,
+        "seed": game.seed,
+        "started": game.start_team,
+        "winner": game.winner,
+        "win_type": game.win_type,
+        "words": game.game_words,
+        "word_assignments": game.original_word_assignments,
+        "turn_history": game.turn_history,
+    }
+    if "pair_id" in game_spec:
+        log_data["pair_id"] = game_spec["pair_id"]
+        log_data["mirrored"] = game.mirrored
+
+    return log_data
+
+def run_concurrent(game_specs, concurrency, write_log, player_options=None, clue_search=None, tournament=None, checkpoint_turns=False):
+    # Games run on worker threads; logs are written from this thread as games
+    # finish, so log writes never race. A failing game (e.g. because a model's
+    # circuit breaker opened) does not stop the others. Returns the matchup and
+    # winner of every finished game.
+    results = []
+    progress = Progress(len(game_specs), in_flight_calls)
+    checkpoints = tournament if checkpoint_turns else None
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {
+            executor.submit(play_game, game_spec, player_options, clue_search, checkpoints): game_spec
+            for game_spec in game_specs
+        }
+        for future in as_completed(futures):
+            game_spec = futures[future]
+            try:
+                log_data = future.result()
+            except Exception as e:
+                logger.warning("Game %s (red) vs %s (blue) failed: %s", game_spec["red"], game_spec["blue"], e)
+                progress.update(failed=True)
+                continue
+            log_path = write_log(log_data)
+            if tournament is not None:
+                tournament.mark_completed(game_spec["index"], log_path)
+            logger.info("Finished game, saved to %s", log_path)
+            progress.update()
+            results.append({key: log_data[key] for key in ("red", "blue", "winner")})
+
+    return results
+
+# Clue search of a worker process, see init_worker.
+worker_clue_search = None
+
+def init_worker(vectors_path):
+    global worker_clue_search
+    # Every worker memory-maps the same .npy file, so the OS shares the matrix
+    # pages between processes instead of each worker holding a copy.
+    worker_clue_search = ClueSearch(WordVectors.load(vectors_path))
+
+def play_shard(game_specs):
+    results = []
+    for game_spec in game_specs:
+        try:
+            results.append(play_game(game_spec, clue_search=worker_clue_search))
+        except Exception as e:
+            results.append(f"{type(e).__name__}: {e}")
+
+    return results
+
+def run_sharded(game_specs, workers, write_log, vectors_path, tournament=None, max_shard_size=100):
+    # Plays local-player games on a pool of processes, to use more than one
+    # core. The plan is split into contiguous shards and results are written in
+    # plan order as shards finish, so the logs do not depend on the number of
+    # workers or on timing.
+    progress = Progress(len(game_specs))
+    # Several shards per worker keep all workers busy until the end.
+    shard_size = max(1, min(max_shard_size, len(game_specs) // (4 * workers)))
+    shards = [game_specs[i : i + shard_size] for i in range(0, len(game_specs), shard_size)]
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(vectors_path,)) as executor:
+        for shard, shard_results in zip(shards, executor.map(play_shard, shards)):
+            for game_spec, log_data in zip(shard, shard_results):
+                if isinstance(log_data, str):
+                    logger.warning("Game %s (red) vs %s (blue) failed: %s", game_spec["red"], game_spec["blue"], log_data)
+                    progress.update(failed=True)
+                    continue
+                log_path = write_log(log_data)
+                if tournament is not None:
+                    tournament.mark_completed(game_spec["index"], log_path)
+                logger.info("Finished game, saved to %s", log_path)
+                progress.update()
+                results.append({key: log_data[key] for key in ("red", "blue", "winner")})
+
+    return results
+
 def parse_args():
     parser = argparse.ArgumentParser()
     parser.add_argument(
@@ -38,36 +202,288 @@ def parse_args():
     parser.add_argument(
         "--log_dir", type=str, default="logs/", help="Directory to save game logs."
     )
+    parser.add_argument(
+        "--log_format",
+        type=str,
+        default="store",
+        choices=["store", "json"],
+        help="'store' appends to JSON Lines segments (see LogStore.py), 'json' writes one game_N.json per game.",
+    )
+    parser.add_argument(
+        "--players",
+        type=str,
+        nargs="+",
+        default=ALLOWED_PLAYERS,
+        help=f"Models to sample matchups from; a single model plays against itself. Use {LOCAL_PLAYERS[0]} for the local embedding agent.",
+    )
+    parser.add_argument(
+        "--vectors",
+        type=str,
+        default=None,
+        help="Path prefix of the word vectors used by local players (see Embeddings.py).",
+    )
+    parser.add_argument(
+        "--schedule",
+        type=str,
+        default="random",
+        choices=["random", "balanced", "adaptive"],
+        help="'random' samples matchups, 'balanced' cycles round robins with balanced colors and start team, 'adaptive' plays batches of games on the pairs whose result is most uncertain.",
+    )
+    parser.add_argument(
+        "--duplicate",
+        action="store_true",
+        help="Play every scheduled board twice, the second time with the models swapping colors. Doubles the number of games.",
+    )
+    parser.add_argument(
+        "--adaptive_batch",
+        type=int,
+        default=10,
+        help="Games scheduled per round with --schedule adaptive.",
+    )
+    parser.add_argument(
+        "--tournament_dir",
+        type=str,
+        default=None,
+        help="Persist the game schedule and progress here; rerunning with the same directory resumes the tournament.",
+    )
+    parser.add_argument(
+        "--checkpoint_turns",
+        action="store_true",
+        help="With --tournament_dir, checkpoint unfinished games after every turn.",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=None,
+        help="Seed for the matchups and boards, makes a tournament reproducible.",
+    )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="count",
+        default=0,
+        help="Log every turn (-v) and the board before every turn (-vv).",
+    )
+    parser.add_argument(
+        "--quiet", action="store_true", help="Only log errors."
+    )
+    parser.add_argument(
+        "--log_json", action="store_true", help="Write log messages as JSON lines."
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=1,
+        help="Number of games to play at the same time.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Processes to play games on. Only for local players (see --vectors), which are CPU bound; LLM games scale with --concurrency instead.",
+    )
+    parser.add_argument(
+        "--max_in_flight_per_model",
+        type=int,
+        default=None,
+        help="Maximum number of concurrent requests sent to a single model.",
+    )
+    parser.add_argument(
+        "--backend",
+        type=str,
+        default="fal",
+        choices=["fal", "mock", "replay"],
+        help="LLM backend. 'mock' and 'replay' run fully offline.",
+    )
+    parser.add_argument(
+        "--mock_latency",
+        type=float,
+        default=0.0,
+        help="Artificial latency in seconds per mock/replay backend call.",
+    )
+    parser.add_argument(
+        "--mock_failure_rate",
+        type=float,
+        default=0.0,
+        help="Probability that a mock backend call raises an error.",
+    )
+    parser.add_argument(
+        "--replay_dir",
+        type=str,
+        default="logs/",
+        help="Directory with game logs to replay when using the replay backend.",
+    )
+    parser.add_argument(
+        "--batch_size",
+        type=int,
+        default=1,
+        help="Batch up to this many concurrent requests from different games into one backend call (mock/replay backends).",
+    )
+    parser.add_argument(
+        "--batch_wait",
+        type=float,
+        default=0.005,
+        help="Seconds the first request of a batch waits for more requests.",
+    )
+    parser.add_argument(
+        "--cache_path",
+        type=str,
+        default="cache/responses.sqlite",
+        help="SQLite file used to cache fal responses.",
+    )
+    parser.add_argument(
+        "--cache_max_entries",
+        type=int,
+        default=100_000,
+        help="Maximum number of cached responses before LRU eviction.",
+    )
+    parser.add_argument(
+        "--prompt_mode",
+        type=str,
+        default="full",
+        choices=["full", "compact"],
+        help="'compact' sends shorter rules and a dense board encoding.",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Stream answers: stop reading at the end of the JSON object and reveal guesses as they arrive. Backends that cannot stream answer in a single chunk.",
+    )
+    parser.add_argument(
+        "--metrics_path",
+        type=str,
+        default=None,
+        help="JSON Lines file that receives one record per LLM call.",
+    )
+    parser.add_argument(
+        "--prices_path",
+        type=str,
+        default=None,
+        help="JSON file with per-model prices in USD per 1M input/output tokens.",
+    )
+    parser.add_argument(
+        "--no_cache",
+        action="store_true",
+        help="Bypass the response cache to sample fresh responses.",
+    )
 
     return parser.parse_args()
 
 
 if __name__ == "__main__":
     args = parse_args()
+    if args.quiet:
+        log_level = logging.ERROR
+    else:
+        log_level = [logging.WARNING, logging.INFO, logging.DEBUG][min(args.verbose, 2)]
+    setup_logging(log_level, args.log_json)
+    set_max_in_flight_per_model(args.max_in_flight_per_model)
+    if len(set(args.players)) == 1:
+        # A single player plays against itself.
+        assert args.schedule != "adaptive", "--schedule adaptive needs at least two players"
+        args.players = args.players[:1] * 2
 
-    for simulation in range(args.num_simulations):
-        red_team, blue_team = random.sample(ALLOWED_PLAYERS, 2)
-        red_spymaster, red_guesser, blue_spymaster, blue_guesser = get_teams(
-            red_team, blue_team
+    if args.backend == "mock":
+        backend = get_backend(
+            "mock", latency=args.mock_latency, failure_rate=args.mock_failure_rate
         )
+    elif args.backend == "replay":
+        backend = get_backend("replay", log_dir=args.replay_dir, latency=args.mock_latency)
+    else:
+        backend = get_backend("fal")
 
-        game = CodeNamesGame(
-            red_spymaster=red_spymaster,
-            red_guesser=red_guesser,
-            blue_spymaster=blue_spymaster,
-            blue_guesser=blue_guesser,
+    if args.batch_size > 1:
+        assert backend.supports_batching, f"the {args.backend} backend does not support batching"
+        backend = BatchingBackend(backend, args.batch_size, args.batch_wait)
+
+    cache = None
+    if args.backend == "fal" and not args.no_cache and not all(model in LOCAL_PLAYERS for model in args.players):
+        cache = ResponseCache(args.cache_path, args.cache_max_entries)
+        backend = CachedBackend(backend, cache)
+
+    tournament = None
+    if args.backend == "replay":
+        # Replay the recorded games on their original boards and matchups.
+        game_specs = [
+            {
+                "red": game["red"],
+                "blue": game["blue"],
+                "seed": game.get("seed"),
+                "board": (game["word_assignments"], game["started"]),
+                **{key: game[key] for key in ("pair_id", "mirrored") if key in game},
+            }
+            for game in backend.games[: args.num_simulations]
+        ]
+    elif args.tournament_dir is not None and Tournament.exists(args.tournament_dir):
+        tournament = Tournament(args.tournament_dir)
+        game_specs = tournament.pending_games()
+        logger.warning(
+            "Resuming tournament in %s: %s of %s games left",
+            args.tournament_dir,
+            len(game_specs),
+            len(tournament.games),
         )
-        game.run()
-
-        log_data = {
-            "blue": blue_team,
-            "red": red_team,
-            "started": game.start_team,
-            "winner": game.winner,
-            "win_type": game.win_type,
-            "words": game.game_words,
-            "word_assignments": game.original_word_assignments,
-            "turn_history": game.turn_history,
-        }
-        with open(get_log_path(args.log_dir), "w") as f:
-            json.dump(log_data, f)
+    elif args.schedule == "adaptive":
+        # Scheduled round by round from the results so far, see below.
+        assert args.tournament_dir is None, "--schedule adaptive does not support --tournament_dir"
+        game_specs = None
+    else:
+        if args.schedule == "balanced":
+            game_specs = balanced_schedule(args.players, args.num_simulations, args.seed)
+        else:
+            game_specs = random_schedule(args.players, args.num_simulations, args.seed)
+        if args.duplicate:
+            game_specs = duplicate_schedule(game_specs)
+        if args.tournament_dir is not None:
+            tournament = Tournament.create(
+                args.tournament_dir,
+                game_specs,
+                players=args.players,
+                seed=args.seed,
+                schedule=args.schedule,
+                duplicate=args.duplicate,
+            )
+            game_specs = tournament.pending_games()
+
+    if args.workers > 1:
+        assert args.vectors and all(model in LOCAL_PLAYERS for model in args.players), "--workers needs local players and --vectors"
+        assert not args.checkpoint_turns, "--workers does not support --checkpoint_turns"
+    clue_search = None
+    if args.vectors and args.workers == 1:
+        clue_search = ClueSearch(WordVectors.load(args.vectors), cache_size=max(args.concurrency, 4))
+
+    prices = load_prices(args.prices_path) if args.prices_path else None
+    metrics = MetricsSink(args.metrics_path, prices)
+    player_options = {"backend": backend, "metrics": metrics, "prompt_mode": args.prompt_mode, "stream": args.stream}
+
+    write_log = get_log_writer(args.log_format, args.log_dir)
+    if game_specs is None:
+        scheduler = AdaptiveScheduler(args.players, args.seed)
+        results = []
+        num_scheduled = 0
+        while num_scheduled < args.num_simulations:
+            batch = scheduler.next_games(results, min(args.adaptive_batch, args.num_simulations - num_scheduled))
+            num_scheduled += len(batch)
+            if args.duplicate:
+                batch = duplicate_schedule(batch)
+            if args.workers > 1:
+                batch_results = run_sharded(batch, args.workers, write_log, args.vectors)
+            else:
+                batch_results = run_concurrent(batch, args.concurrency, write_log, player_options, clue_search)
+            if not batch_results:
+                logger.warning("No game of the last round finished, stopping")
+                break
+            results += batch_results
+    elif args.workers > 1:
+        run_sharded(game_specs, args.workers, write_log, args.vectors, tournament)
+    else:
+        run_concurrent(
+            game_specs, args.concurrency, write_log, player_options, clue_search, tournament, args.checkpoint_turns
+        )
+    metrics.close()
+
+    if isinstance(backend, BatchingBackend):
+        print(f"Request batching: {backend.stats()}")
+    if cache is not None:
+        print(f"Response cache: {cache.stats()}")
+        cache.close()
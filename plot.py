@@ -1,35 +1,232 @@
 import os
 import json
+import math
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from LogStore import LogStore
+from Ratings import PairedResults, Ratings, bootstrap_intervals, bradley_terry
+
+
+WIN_TYPES = ["correct_guess", "incorrect_guess", "assassin"]
+
+# Request latencies are kept as log-spaced histograms (10 bins per decade from
+# 1ms) so percentiles can be computed from aggregate state.
+LATENCY_MIN = 1e-3
+LATENCY_BINS_PER_DECADE = 10
+NUM_LATENCY_BINS = 6 * LATENCY_BINS_PER_DECADE + 1
+
+
+def latency_bin(seconds):
+    if seconds <= LATENCY_MIN:
+        return 0
+    index = int(math.log10(seconds / LATENCY_MIN) * LATENCY_BINS_PER_DECADE) + 1
+    return min(index, NUM_LATENCY_BINS - 1)
+
+
+def latency_percentile(histogram, q):
+    # Upper edge of the bin that contains the q-th percentile.
+    total = sum(histogram)
+    if total == 0:
+        return 0.0
+    cumulative = 0
+    for index, count in enumerate(histogram):
+        cumulative += count
+        if cumulative >= q / 100 * total:
+            break
+
+    return LATENCY_MIN * 10 ** (index / LATENCY_BINS_PER_DECADE)
+
+
+class GameStats:
+    # Running aggregates for all plots, updated one game at a time so logs can be
+    # streamed instead of loaded into memory. The state is plain JSON so it can be
+    # persisted between runs and extended with new games only.
+    def __init__(self, state=None):
+        state = state or {}
+        self.num_games = state.get("num_games", 0)
+        self.games_played = state.get("games_played", {})
+        self.win_data = state.get("win_data", {})
+        self.win_type_counts = state.get(
+            "win_type_counts", {win_type: 0 for win_type in WIN_TYPES}
+        )
+        self.spymaster_cards = state.get("spymaster_cards", {})
+        self.turn_counts = state.get("turn_counts", {})
+        self.accuracy = state.get("accuracy", {})
+        self.first_move_wins = state.get(
+            "first_move_wins", {"started": 0, "not_started": 0}
+        )
+        self.latency = state.get("latency", {})
+        self.cost = state.get("cost", {})
+        self.ratings = Ratings(state.get("ratings"))
+        self.paired = PairedResults(state.get("paired"))
+
+    def add_team(self, team):
+        if team in self.games_played:
+            return
+        self.games_played[team] = {"blue": 0, "red": 0}
+        self.win_data[team] = {
+            "total_wins": 0,
+            "win_types": {win_type: 0 for win_type in WIN_TYPES},
+        }
+        self.spymaster_cards[team] = {"sum": 0, "count": 0}
+        self.turn_counts[team] = {"sum": 0, "count": 0}
+        self.accuracy[team] = {"correct": 0, "total": 0}
+        self.latency[team] = [0] * NUM_LATENCY_BINS
+        self.cost[team] = {"sum": 0.0, "count": 0}
+
+    def update(self, game):
+        blue_team = game["blue"]
+        red_team = game["red"]
+        self.add_team(blue_team)
+        self.add_team(red_team)
+        self.num_games += 1
 
-import numpy as np
-import matplotlib.pyplot as plt
-
-from matplotlib.ticker import MaxNLocator
-
+        self.games_played[blue_team]["blue"] += 1
+        self.games_played[red_team]["red"] += 1
 
-def plot_average_spymaster_num_cards(data, save_path):
-    spymaster_counts = {}
+        winner = game[game["winner"]]  # Get the winning team
+        win_type = game["win_type"]
+        self.ratings.update(game)
+        self.paired.update(game)
+        self.win_data[winner]["total_wins"] += 1
+        self.win_data[winner]["win_types"][win_type] += 1
+        if win_type in self.win_type_counts:
+            self.win_type_counts[win_type] += 1
+
+        num_turns = game["num_turns"] if "num_turns" in game else len(game["turn_history"])
+        for team in (blue_team, red_team):
+            self.turn_counts[team]["sum"] += num_turns
+            self.turn_counts[team]["count"] += 1
 
-    # Iterate over games to collect spymaster numbers
-    for game in data:
-        blue_team = game["blue"]
-        red_team = game["red"]
+        if game["started"] == game["winner"]:
+            self.first_move_wins["started"] += 1
+        else:
+            self.first_move_wins["not_started"] += 1
 
-        if blue_team not in spymaster_counts:
-            spymaster_counts[blue_team] = []
-        if red_team not in spymaster_counts:
-            spymaster_counts[red_team] = []
+        # Games read without their turns only update the game-level statistics.
+        if "turn_history" not in game:
+            return
 
-        # Extract spymaster numbers from turn history
+        own_words = {
+            color: set(game["word_assignments"][color]) for color in ("blue", "red")
+        }
         for turn in game["turn_history"]:
             team = game[turn["team"]]  # Get team name
-            num_cards = int(turn["spymaster"][1])  # Second element is the number given
+            self.spymaster_cards[team]["sum"] += int(turn["spymaster"][1])
+            self.spymaster_cards[team]["count"] += 1
+
+            guesses = turn["guesser"]
+            self.accuracy[team]["correct"] += sum(
+                1 for word in guesses if word in own_words[turn["team"]]
+            )
+            self.accuracy[team]["total"] += len(guesses)
+
+            # Call metrics, missing for local players and older logs.
+            for role_stats in (turn.get("stats") or {}).values():
+                if not role_stats or "request_seconds" not in role_stats:
+                    continue
+                self.latency[team][latency_bin(role_stats["request_seconds"])] += 1
+                if role_stats.get("cost") is not None:
+                    self.cost[team]["sum"] += role_stats["cost"]
+                    self.cost[team]["count"] += 1
+
+    def to_dict(self):
+        return {
+            "num_games": self.num_games,
+            "games_played": self.games_played,
+            "win_data": self.win_data,
+            "win_type_counts": self.win_type_counts,
+            "spymaster_cards": self.spymaster_cards,
+            "turn_counts": self.turn_counts,
+            "accuracy": self.accuracy,
+            "first_move_wins": self.first_move_wins,
+            "latency": self.latency,
+            "cost": self.cost,
+            "ratings": self.ratings.to_dict(),
+            "paired": self.paired.to_dict(),
+        }
+
+
+# Game-level columns the plots need from a log store.
+GAME_COLUMNS = ["blue", "red", "started", "winner", "win_type", "num_turns", "word_assignments", "pair_id", "mirrored"]
+
+
+def list_log_files(log_dir="logs/"):
+    return sorted(
+        f for f in os.listdir(log_dir) if f.endswith(".json") and not f.startswith(".")
+    )
 
-            spymaster_counts[team].append(num_cards)
 
+def iter_games(log_dir="logs/", file_names=None, columns=None, with_turns=True, offsets=None):
+    # Reads a log store when log_dir has one (projecting `columns`, and skipping
+    # turn rows entirely without `with_turns`), otherwise game_N.json files.
+    if LogStore.exists(log_dir):
+        yield from LogStore(log_dir).iter_games(columns, with_turns, offsets)
+        return
+
+    file_names = file_names if file_names is not None else list_log_files(log_dir)
+    for file_name in file_names:
+        with open(os.path.join(log_dir, file_name), "r") as f:
+            yield json.load(f)
+
+
+def aggregate(log_dir="logs/", state_path=None, with_turns=True):
+    # With a state_path, previously aggregated games are loaded from it and only
+    # new games are read: log store rows past the stored offsets, or log files
+    # that were not seen in an earlier run.
+    state = {}
+    if state_path is not None and os.path.exists(state_path):
+        with open(state_path, "r") as f:
+            state = json.load(f)
+
+    stats = GameStats(state.get("stats"))
+    processed = set(state.get("processed_files", []))
+    offsets = state.get("offsets", {})
+    new_files = None
+    if not LogStore.exists(log_dir):
+        new_files = [f for f in list_log_files(log_dir) if f not in processed]
+        processed.update(new_files)
+    for game in iter_games(log_dir, new_files, GAME_COLUMNS, with_turns, offsets):
+        stats.update(game)
+
+    if state_path is not None:
+        state = {
+            "processed_files": sorted(processed),
+            "offsets": offsets,
+            "stats": stats.to_dict(),
+        }
+        tmp_path = f"{state_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, state_path)
+
+    return stats
+
+
+def pyplot():
+    # matplotlib is only imported once a chart is rendered, with the
+    # non-interactive Agg backend so rendering works headless and in worker
+    # processes.
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    return plt
+
+
+def plot_average_spymaster_num_cards(stats, save_path):
     # Compute averages
-    teams = list(spymaster_counts.keys())
-    avg_cards = [np.mean(spymaster_counts[team]) for team in teams]
+    plt = pyplot()
+    teams = list(stats.spymaster_cards.keys())
+    avg_cards = [
+        stats.spymaster_cards[team]["sum"] / stats.spymaster_cards[team]["count"]
+        if stats.spymaster_cards[team]["count"] > 0
+        else 0
+        for team in teams
+    ]
 
     # Plot results
     fig, ax = plt.subplots(figsize=(10, 6))
@@ -51,41 +248,15 @@ def plot_average_spymaster_num_cards(data, save_path):
     # Save plot
     plt.tight_layout()
     plt.savefig(save_path)
+    plt.close(fig)
 
 
-def plot_win_rates(data, save_path):
-    win_data = {}
-    games_played = {}
-
-    # Count wins by team, win type, and games played
-    for game in data:
-        blue_team = game["blue"]
-        red_team = game["red"]
-        winner = game[game["winner"]]  # Get the winning team
-        win_type = game["win_type"]  # Get the win type
-
-        # For blue team
-        if blue_team not in win_data:
-            win_data[blue_team] = {
-                "total_wins": 0,
-                "win_types": {"correct_guess": 0, "incorrect_guess": 0, "assassin": 0},
-            }
-            games_played[blue_team] = 0  # Track games played by blue team
-        # For red team
-        if red_team not in win_data:
-            win_data[red_team] = {
-                "total_wins": 0,
-                "win_types": {"correct_guess": 0, "incorrect_guess": 0, "assassin": 0},
-            }
-            games_played[red_team] = 0  # Track games played by red team
-
-        # Increment total games played for each team
-        games_played[blue_team] += 1
-        games_played[red_team] += 1
-
-        # Increment win type count for the winning team
-        win_data[winner]["total_wins"] += 1
-        win_data[winner]["win_types"][win_type] += 1
+def plot_win_rates(stats, save_path):
+    plt = pyplot()
+    win_data = stats.win_data
+    games_played = {
+        team: counts["blue"] + counts["red"] for team, counts in stats.games_played.items()
+    }
 
     # Prepare data for the plot
     teams = list(win_data.keys())
@@ -115,7 +286,7 @@ def plot_win_rates(data, save_path):
 
     # Add labels and title
     ax.set_ylabel("Number of Wins")
-    ax.set_title(f"Team Win Counts by Win Type ({len(data)} games)")
+    ax.set_title(f"Team Win Counts by Win Type ({stats.num_games} games)")
     ax.legend(title="Win Types", loc="upper right", bbox_to_anchor=(1.05, 1))
     # Calculate and display win rates above the bars
     for i, team in enumerate(teams):
@@ -128,22 +299,17 @@ def plot_win_rates(data, save_path):
 
     # Rotate the x-axis labels for better readability
     plt.xticks(rotation=45, ha="right")
-    ax.yaxis.set_major_locator(MaxNLocator(integer=True))
+    ax.yaxis.set_major_locator(plt.MaxNLocator(integer=True))
 
     # Save the plot to the specified path
     plt.tight_layout()
     plt.savefig(save_path)
+    plt.close(fig)
 
 
-def plot_game_ending_types(data, save_path):
-    # Initialize a dictionary to count occurrences of each win type
-    win_type_counts = {"correct_guess": 0, "incorrect_guess": 0, "assassin": 0}
-
-    # Count the occurrences of each win type
-    for game in data:
-        win_type = game["win_type"]
-        if win_type in win_type_counts:
-            win_type_counts[win_type] += 1
+def plot_game_ending_types(stats, save_path):
+    plt = pyplot()
+    win_type_counts = stats.win_type_counts
 
     # Data for the pie chart
     labels = list(win_type_counts.keys())
@@ -163,24 +329,17 @@ def plot_game_ending_types(data, save_path):
     ax.axis("equal")  # Equal aspect ratio ensures that pie is drawn as a circle
 
     # Add title
-    ax.set_title(f"Distribution of Game Ending Types ({len(data)} games)")
+    ax.set_title(f"Distribution of Game Ending Types ({stats.num_games} games)")
 
     # Save the plot to the specified path
     plt.tight_layout()
     plt.savefig(save_path)
+    plt.close(fig)
 
 
-def plot_num_games_played(data, save_path):
-    games_played = {}
-    for game in data:
-        blue_team = game["blue"]
-        red_team = game["red"]
-        if not games_played.get(blue_team):
-            games_played[blue_team] = {"blue": 0, "red": 0}
-        if not games_played.get(red_team):
-            games_played[red_team] = {"blue": 0, "red": 0}
-        games_played[blue_team]["blue"] += 1
-        games_played[red_team]["red"] += 1
+def plot_num_games_played(stats, save_path):
+    plt = pyplot()
+    games_played = stats.games_played
 
     teams = list(games_played.keys())
     blue_games = [games_played[team]["blue"] for team in teams]
@@ -193,7 +352,7 @@ def plot_num_games_played(data, save_path):
 
     # Add labels and title
     ax.set_ylabel("Number of Games Played")
-    ax.set_title(f"Games Played as Blue and Red Teams ({len(data)} games)")
+    ax.set_title(f"Games Played as Blue and Red Teams ({stats.num_games} games)")
     ax.legend()
 
     # Rotate the x-axis labels for better readability
@@ -201,69 +360,35 @@ def plot_num_games_played(data, save_path):
 
     plt.tight_layout()
     plt.savefig(save_path)
+    plt.close(fig)
 
 
-def read_data(log_dir="logs/"):
-    data = []
-    for file_path in os.listdir(log_dir):
-        if not file_path.endswith(".json"):
-            continue
-        with open(f"{log_dir}/{file_path}", "r") as f:
-            data.append(json.load(f))
-
-    return data
-
-
-def plot_average_turns_per_game(data, save_path):
-    turn_counts = {}
-
-    for game in data:
-        blue_team = game["blue"]
-        red_team = game["red"]
-        num_turns = len(game["turn_history"])
-
-        if blue_team not in turn_counts:
-            turn_counts[blue_team] = []
-        if red_team not in turn_counts:
-            turn_counts[red_team] = []
-
-        turn_counts[blue_team].append(num_turns)
-        turn_counts[red_team].append(num_turns)
+def plot_average_turns_per_game(stats, save_path):
+    plt = pyplot()
+    turn_counts = stats.turn_counts
 
     teams = list(turn_counts.keys())
-    avg_turns = [np.mean(turn_counts[team]) for team in teams]
+    avg_turns = [
+        turn_counts[team]["sum"] / turn_counts[team]["count"]
+        if turn_counts[team]["count"] > 0
+        else 0
+        for team in teams
+    ]
 
     fig, ax = plt.subplots(figsize=(10, 6))
     ax.bar(teams, avg_turns, color="purple")
     ax.set_ylabel("Average Turns per Game")
-    ax.set_title(f"Average Turns per Game per Team ({len(data)} games)")
+    ax.set_title(f"Average Turns per Game per Team ({stats.num_games} games)")
     ax.yaxis.set_major_locator(plt.MaxNLocator(integer=True))
     plt.xticks(rotation=45, ha="right")
     plt.tight_layout()
     plt.savefig(save_path)
+    plt.close(fig)
 
 
-def plot_guessing_accuracy_per_team(data, save_path):
-    accuracy = {}
-
-    for game in data:
-        blue_team = game["blue"]
-        red_team = game["red"]
-
-        if blue_team not in accuracy:
-            accuracy[blue_team] = {"correct": 0, "total": 0}
-        if red_team not in accuracy:
-            accuracy[red_team] = {"correct": 0, "total": 0}
-
-        for turn in game["turn_history"]:
-            team = game[turn["team"]]
-            guesses = turn["guesser"]
-            correct_guesses = sum(
-                1 for word in guesses if word in game["word_assignments"][turn["team"]]
-            )
-
-            accuracy[team]["correct"] += correct_guesses
-            accuracy[team]["total"] += len(guesses)
+def plot_guessing_accuracy_per_team(stats, save_path):
+    plt = pyplot()
+    accuracy = stats.accuracy
 
     teams = list(accuracy.keys())
     accuracy_rates = [
@@ -276,41 +401,239 @@ def plot_guessing_accuracy_per_team(data, save_path):
     fig, ax = plt.subplots(figsize=(10, 6))
     ax.bar(teams, accuracy_rates, color="green")
     ax.set_ylabel("Guessing Accuracy")
-    ax.set_title(f"Guessing Accuracy per Team ({len(data)} games)")
+    ax.set_title(f"Guessing Accuracy per Team ({stats.num_games} games)")
     ax.set_ylim(0, 1)
     plt.xticks(rotation=45, ha="right")
     plt.tight_layout()
     plt.savefig(save_path)
+    plt.close(fig)
 
 
-def plot_first_move_advantage(data, save_path):
-    first_move_wins = {"started": 0, "not_started": 0}
-
-    for game in data:
-        if game["started"] == game["winner"]:
-            first_move_wins["started"] += 1
-        else:
-            first_move_wins["not_started"] += 1
+def plot_first_move_advantage(stats, save_path):
+    plt = pyplot()
+    first_move_wins = stats.first_move_wins
 
     fig, ax = plt.subplots(figsize=(8, 6))
     ax.bar(first_move_wins.keys(), first_move_wins.values(), color=["blue", "red"])
     ax.set_ylabel("Number of Wins")
-    ax.set_title(f"First Move Advantage: Win Rate Comparison ({len(data)} games)")
+    ax.set_title(f"First Move Advantage: Win Rate Comparison ({stats.num_games} games)")
     plt.tight_layout()
     plt.savefig(save_path)
+    plt.close(fig)
 
 
-if __name__ == "__main__":
-    output_dir = "plots/"
+def plot_latency_percentiles(stats, save_path):
+    plt = pyplot()
+    teams = [team for team in stats.latency if sum(stats.latency[team]) > 0]
+    percentiles = {"p50": 50, "p90": 90, "p99": 99}
+    width = 0.8 / len(percentiles)
+
+    fig, ax = plt.subplots(figsize=(10, 6))
+    for i, (label, q) in enumerate(percentiles.items()):
+        values = [latency_percentile(stats.latency[team], q) for team in teams]
+        positions = [j + (i - 1) * width for j in range(len(teams))]
+        ax.bar(positions, values, width=width, label=label)
+
+    ax.set_xticks(range(len(teams)))
+    ax.set_xticklabels(teams, rotation=45, ha="right")
+    ax.set_ylabel("Request Latency per Turn (s)")
+    ax.set_yscale("log")
+    ax.set_title(f"LLM Request Latency Percentiles per Team ({stats.num_games} games)")
+    ax.legend()
+    plt.tight_layout()
+    plt.savefig(save_path)
+    plt.close(fig)
+
+
+def plot_cost_per_win(stats, save_path):
+    plt = pyplot()
+    teams = [team for team in stats.cost if stats.cost[team]["count"] > 0]
+    cost_per_win = [
+        stats.cost[team]["sum"] / stats.win_data[team]["total_wins"]
+        if stats.win_data[team]["total_wins"] > 0
+        else 0
+        for team in teams
+    ]
+
+    fig, ax = plt.subplots(figsize=(10, 6))
+    ax.bar(teams, cost_per_win, color="orange")
+    ax.set_ylabel("Cost per Win (USD)")
+    ax.set_title(f"LLM Cost per Win per Team ({stats.num_games} games)")
+    plt.xticks(rotation=45, ha="right")
+    plt.tight_layout()
+    plt.savefig(save_path)
+    plt.close(fig)
+
+
+def plot_ratings(stats, save_path):
+    # Bradley-Terry ratings with 95% bootstrap intervals, next to the Elo
+    # ratings. Unlike raw win rates these account for who played whom. With
+    # few games the fit can sit outside its interval; the bar is then cut at
+    # the point.
+    plt = pyplot()
+    models, wins = stats.ratings.result_matrix()
+    strengths = bradley_terry(wins)
+    lower, upper = bootstrap_intervals(wins, seed=0)
+    order = sorted(range(len(models)), key=lambda i: strengths[i], reverse=True)
+
+    x = range(len(order))
+    fig, ax = plt.subplots(figsize=(10, 6))
+    ax.errorbar(
+        x,
+        [strengths[i] for i in order],
+        yerr=[
+            [max(strengths[i] - lower[i], 0.0) for i in order],
+            [max(upper[i] - strengths[i], 0.0) for i in order],
+        ],
+        fmt="o",
+        capsize=4,
+        label="Bradley-Terry (95% CI)",
+    )
+    ax.scatter(x, [stats.ratings.elo[models[i]] for i in order], marker="x", color="red", label="Elo")
+    ax.set_xticks(list(x))
+    ax.set_xticklabels([models[i] for i in order], rotation=45, ha="right")
+    ax.set_ylabel("Rating")
+    ax.set_title(f"Model Ratings ({stats.num_games} games)")
+    ax.legend()
+    plt.tight_layout()
+    plt.savefig(save_path)
+    plt.close(fig)
+
+
+def plot_paired_scores(stats, save_path):
+    # Duplicate games only: the share of board pairs each model won, counting a
+    # split pair as half, with one standard error.
+    plt = pyplot()
+    summary = stats.paired.summary()
+    models = sorted(summary, key=lambda model: summary[model]["score"], reverse=True)
+    num_pairs = sum(summary[model]["pairs"] for model in models) // 2
+
+    fig, ax = plt.subplots(figsize=(10, 6))
+    ax.bar(
+        models,
+        [summary[model]["score"] for model in models],
+        yerr=[summary[model]["stderr"] for model in models],
+        capsize=4,
+        color="teal",
+    )
+    ax.axhline(0.5, color="gray", linestyle="--")
+    ax.set_ylim(0, 1)
+    ax.set_ylabel("Paired Score")
+    ax.set_title(f"Paired Score on Mirrored Boards ({num_pairs} pairs)")
+    plt.xticks(rotation=45, ha="right")
+    plt.tight_layout()
+    plt.savefig(save_path)
+    plt.close(fig)
+
+
+# Chart file, plot function and the GameStats fields it reads. A chart is only
+# rendered again when these inputs changed.
+CHARTS = [
+    ("num_games_played.png", plot_num_games_played, ["games_played", "num_games"]),
+    ("win_rates.png", plot_win_rates, ["win_data", "games_played", "num_games"]),
+    ("game_endings.png", plot_game_ending_types, ["win_type_counts", "num_games"]),
+    ("avg_spymaster_card.png", plot_average_spymaster_num_cards, ["spymaster_cards"]),
+    ("average_turns_per_game.png", plot_average_turns_per_game, ["turn_counts", "num_games"]),
+    ("guessing_accuracy_per_team.png", plot_guessing_accuracy_per_team, ["accuracy", "num_games"]),
+    ("first_move_advantage.png", plot_first_move_advantage, ["first_move_wins", "num_games"]),
+    ("latency_percentiles.png", plot_latency_percentiles, ["latency", "num_games"]),
+    ("cost_per_win.png", plot_cost_per_win, ["cost", "win_data", "num_games"]),
+    ("ratings.png", plot_ratings, ["ratings", "num_games"]),
+    ("paired_scores.png", plot_paired_scores, ["paired"]),
+]
+
+
+def render_chart(plot_function, state, save_path):
+    plot_function(GameStats(state), save_path)
+
+
+def render(stats, output_dir="plots/", jobs=None, force=False):
+    # Renders the charts whose inputs changed since the last render (hashes are
+    # kept in <output_dir>/.render_cache.json), on a process pool unless jobs
+    # is 1. Returns the file names of the rendered charts.
     os.makedirs(output_dir, exist_ok=True)
-    data = read_data(log_dir="logs/")
-
-    plot_num_games_played(data, f"{output_dir}/num_games_played.png")
-    plot_win_rates(data, f"{output_dir}/win_rates.png")
-    plot_game_ending_types(data, f"{output_dir}/game_endings.png")
-    plot_average_spymaster_num_cards(data, f"{output_dir}/avg_spymaster_card.png")
-    plot_average_turns_per_game(data, f"{output_dir}/average_turns_per_game.png")
-    plot_guessing_accuracy_per_team(
-        data, f"{output_dir}/guessing_accuracy_per_team.png"
+    cache_path = os.path.join(output_dir, ".render_cache.json")
+    cache = {}
+    if os.path.exists(cache_path) and not force:
+        with open(cache_path, "r") as f:
+            cache = json.load(f)
+
+    state = stats.to_dict()
+    todo = []
+    for file_name, plot_function, inputs in CHARTS:
+        if plot_function is plot_paired_scores and not stats.paired.scores:
+            continue
+        if plot_function is plot_ratings and not stats.ratings.wins:
+            continue
+        digest = hashlib.sha256(
+            json.dumps([plot_function.__name__, {key: state[key] for key in inputs}], sort_keys=True).encode()
+        ).hexdigest()
+        save_path = os.path.join(output_dir, file_name)
+        if cache.get(file_name) == digest and os.path.exists(save_path):
+            continue
+        todo.append((file_name, plot_function, save_path, digest))
+
+    if jobs == 1 or len(todo) <= 1:
+        for _, plot_function, save_path, _ in todo:
+            render_chart(plot_function, state, save_path)
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = [
+                executor.submit(render_chart, plot_function, state, save_path)
+                for _, plot_function, save_path, _ in todo
+            ]
+            for future in futures:
+                future.result()
+
+    cache.update({file_name: digest for file_name, _, _, digest in todo})
+    tmp_path = f"{cache_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(cache, f)
+    os.replace(tmp_path, cache_path)
+
+    return [file_name for file_name, _, _, _ in todo]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--log_dir", type=str, default="logs/", help="Directory with game logs."
+    )
+    parser.add_argument(
+        "--output_dir", type=str, default="plots/", help="Directory to save plots."
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Reuse the aggregates of the previous run and only read new logs.",
+    )
+    parser.add_argument(
+        "--state_path",
+        type=str,
+        default=None,
+        help="Where incremental aggregate state is kept (default: <log_dir>/.plot_state.json).",
     )
-    plot_first_move_advantage(data, f"{output_dir}/first_move_advantage.png")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=None,
+        help="Processes to render charts on (default: one per CPU, 1 renders in this process).",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Render all charts, even those whose inputs did not change.",
+    )
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    state_path = None
+    if args.incremental:
+        state_path = args.state_path or os.path.join(args.log_dir, ".plot_state.json")
+    stats = aggregate(log_dir=args.log_dir, state_path=state_path)
+
+    rendered = render(stats, args.output_dir, args.jobs, args.force)
+    print(f"Rendered {len(rendered)} charts to {args.output_dir}: {', '.join(rendered) or 'all up to date'}")